@@ -8,7 +8,8 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from alembic import context
 
-from database import Base, DATABASE_URL
+from config import get_settings
+from database import Base
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -17,7 +18,10 @@ config = context.config
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 
-config.set_main_option("sqlalchemy.url", DATABASE_URL)
+config.set_main_option("sqlalchemy.url", get_settings().get_db_url())
+MIGRATION_LOCK_TIMEOUT = context.get_x_argument(as_dictionary=True).get(
+    "lock_timeout", "5s"
+)
 
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
@@ -59,7 +63,13 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # One transaction per revision keeps locks short and lets revisions use
+    # online_migrations helpers that step out of the transaction.
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        transaction_per_migration=True,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -75,6 +85,9 @@ async def run_async_migrations() -> None:
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
+        # Fail fast instead of queueing behind live traffic; DDL taking
+        # ACCESS EXCLUSIVE would otherwise block every query queued after it.
+        connect_args={"server_settings": {"lock_timeout": MIGRATION_LOCK_TIMEOUT}},
     )
 
     async with connectable.connect() as connection:
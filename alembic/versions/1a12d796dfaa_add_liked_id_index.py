@@ -0,0 +1,25 @@
+"""Add liked_id index
+
+Revision ID: 1a12d796dfaa
+Revises: 192c7c50152e
+Create Date: 2026-10-19 12:04:41.310275
+
+"""
+from typing import Sequence, Union
+
+from online_migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1a12d796dfaa'
+down_revision: Union[str, None] = '192c7c50152e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_index_concurrently('ix_profilelikes_liked_id', 'profilelikes', ['liked_id'])
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_profilelikes_liked_id')
@@ -0,0 +1,73 @@
+"""Add notification preferences
+
+Revision ID: 1d6a783b0ec4
+Revises: 1a12d796dfaa
+Create Date: 2026-10-19 14:21:07.513920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from online_migrations import (
+    create_index_concurrently,
+    drop_index_concurrently,
+    with_lock_retry,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d6a783b0ec4'
+down_revision: Union[str, None] = '1a12d796dfaa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _get_notification_mode(create_type=True):
+    return postgresql.ENUM(
+        "INSTANT", "HOURLY", "DAILY", name="notificationmode", create_type=create_type
+    )
+
+
+def upgrade() -> None:
+    _get_notification_mode().create(op.get_bind(), checkfirst=True)
+    # constant and now() defaults don't rewrite the table
+    with_lock_retry(lambda: op.add_column(
+        'profiles',
+        sa.Column(
+            'notifications',
+            _get_notification_mode(create_type=False),
+            server_default='INSTANT',
+            nullable=False,
+        ),
+    ))
+    with_lock_retry(lambda: op.add_column(
+        'profiles',
+        sa.Column('digest_sent_at', sa.DateTime(timezone=True), nullable=True),
+    ))
+    with_lock_retry(lambda: op.add_column(
+        'profilelikes',
+        sa.Column(
+            'created_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=False,
+        ),
+    ))
+    create_index_concurrently(
+        'ix_profilelikes_liked_id_created_at',
+        'profilelikes',
+        ['liked_id', 'created_at'],
+    )
+    drop_index_concurrently('ix_profilelikes_liked_id')
+
+
+def downgrade() -> None:
+    create_index_concurrently('ix_profilelikes_liked_id', 'profilelikes', ['liked_id'])
+    drop_index_concurrently('ix_profilelikes_liked_id_created_at')
+    with_lock_retry(lambda: op.drop_column('profilelikes', 'created_at'))
+    with_lock_retry(lambda: op.drop_column('profiles', 'digest_sent_at'))
+    with_lock_retry(lambda: op.drop_column('profiles', 'notifications'))
+    _get_notification_mode().drop(op.get_bind())
@@ -0,0 +1,50 @@
+"""Add demos
+
+Revision ID: 7b8fdaf2830c
+Revises: 84dd544f87b4
+Create Date: 2026-10-19 18:24:37.610294
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b8fdaf2830c'
+down_revision: Union[str, None] = '84dd544f87b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _get_demo_kind(create_type=True):
+    return postgresql.ENUM(
+        "VOICE", "AUDIO", "VIDEO", name="demokind", create_type=create_type
+    )
+
+
+def upgrade() -> None:
+    _get_demo_kind().create(op.get_bind(), checkfirst=True)
+    op.create_table('demos',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('profile_id', sa.BigInteger(), nullable=False),
+    sa.Column('kind', _get_demo_kind(create_type=False), nullable=False),
+    sa.Column('file_id', sa.String(length=200), nullable=False),
+    sa.Column('file_unique_id', sa.String(length=100), nullable=False),
+    sa.Column('duration', sa.Integer(), nullable=True),
+    sa.Column('mime_type', sa.String(length=100), nullable=True),
+    sa.Column('file_size', sa.BigInteger(), nullable=True),
+    sa.Column('title', sa.String(length=200), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['profile_id'], ['profiles.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_demos_profile_id'), 'demos', ['profile_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_demos_profile_id'), table_name='demos')
+    op.drop_table('demos')
+    _get_demo_kind().drop(op.get_bind())
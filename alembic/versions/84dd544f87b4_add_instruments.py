@@ -0,0 +1,83 @@
+"""Add instruments
+
+Revision ID: 84dd544f87b4
+Revises: 8c0e2f5d7a41
+Create Date: 2026-10-19 17:02:13.481905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from online_migrations import (
+    create_index_concurrently,
+    drop_index_concurrently,
+    with_lock_retry,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = '84dd544f87b4'
+down_revision: Union[str, None] = '8c0e2f5d7a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# ids are referenced by utils.MusicInstrument, keep them in sync
+INSTRUMENTS = [
+    (1, 'Вокал'),
+    (2, 'Гитара'),
+    (3, 'Бас-гитара'),
+    (4, 'Барабаны'),
+    (5, 'Клавишные'),
+    (6, 'Струнные'),
+    (7, 'Духовые'),
+]
+
+
+def upgrade() -> None:
+    instruments = op.create_table('instruments',
+    sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(instruments, [{'id': id, 'name': name} for id, name in INSTRUMENTS])
+    op.create_table('instrumentitems',
+    sa.Column('profile_id', sa.BigInteger(), nullable=False),
+    sa.Column('instrument_id', sa.BigInteger(), nullable=False),
+    sa.Column('experience', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['instrument_id'], ['instruments.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['profile_id'], ['profiles.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('profile_id', 'instrument_id')
+    )
+    op.create_index(
+        'ix_instrumentitems_instrument_id_experience',
+        'instrumentitems',
+        ['instrument_id', 'experience'],
+    )
+    # a constant default doesn't rewrite the table
+    with_lock_retry(lambda: op.add_column(
+        'profiles',
+        sa.Column(
+            'instrument_ids',
+            postgresql.ARRAY(sa.BigInteger()),
+            server_default='{}',
+            nullable=False,
+        ),
+    ))
+    create_index_concurrently(
+        'ix_profiles_instrument_ids', 'profiles', ['instrument_ids'], using='gin'
+    )
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_profiles_instrument_ids')
+    with_lock_retry(lambda: op.drop_column('profiles', 'instrument_ids'))
+    op.drop_index(
+        'ix_instrumentitems_instrument_id_experience', table_name='instrumentitems'
+    )
+    op.drop_table('instrumentitems')
+    op.drop_table('instruments')
@@ -0,0 +1,59 @@
+"""Add profilestats view
+
+Revision ID: 8c0e2f5d7a41
+Revises: 3f49e4abb910
+Create Date: 2026-10-19 16:10:52.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c0e2f5d7a41'
+down_revision: Union[str, None] = '3f49e4abb910'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Per faculty and education: profiles, profiles that liked someone, likes
+    # given and likes that were returned (every match is counted on both
+    # sides). Refreshed by the refresh_stats job.
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW profilestats AS
+        SELECT
+            p.faculty,
+            p.education,
+            count(*) AS profiles,
+            count(l.liker_id) AS likers,
+            coalesce(sum(l.likes), 0)::bigint AS likes,
+            coalesce(sum(l.matches), 0)::bigint AS matches
+        FROM profiles p
+        LEFT JOIN (
+            SELECT
+                pl.liker_id,
+                count(*) AS likes,
+                count(*) FILTER (WHERE EXISTS (
+                    SELECT 1 FROM profilelikes r
+                    WHERE r.liker_id = pl.liked_id AND r.liked_id = pl.liker_id
+                )) AS matches
+            FROM profilelikes pl
+            GROUP BY pl.liker_id
+        ) l ON l.liker_id = p.id
+        GROUP BY p.faculty, p.education
+        """
+    )
+    # REFRESH ... CONCURRENTLY needs a unique index
+    op.create_index(
+        'ix_profilestats_faculty_education',
+        'profilestats',
+        ['faculty', 'education'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW profilestats")
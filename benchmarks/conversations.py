@@ -0,0 +1,170 @@
+"""Handler-level benchmark: simulated conversations against MemoryStorage.
+
+Every simulated user fills in the questionnaire step by step and then swipes
+through the feed, liking some of the cards. Handlers are called directly
+with stub updates, so the numbers are the bot's own Python overhead, with no
+database or Telegram round trips in them.
+
+    python -m benchmarks.conversations --users 2000 --swipes 20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+# the memory backend never connects, placeholder settings are enough
+os.environ["STORAGE_BACKEND"] = "memory"
+for name, value in (
+    ("POSTGRES_USER", "bench"),
+    ("POSTGRES_PASSWORD", "bench"),
+    ("POSTGRES_DB", "bench"),
+    ("POSTGRES_HOST", "localhost"),
+    ("POSTGRES_PORT", "5432"),
+):
+    os.environ.setdefault(name, value)
+
+import main as bot  # noqa: E402
+from lifecycle import lifecycle  # noqa: E402
+from utils import Replies as replies  # noqa: E402
+
+
+FIRST_ID = 9_900_000_000
+
+HANDLERS = {
+    bot.MAIN: bot.main,
+    bot.NAME: bot.name,
+    bot.FACULTY: bot.faculty,
+    bot.COURSE: bot.course,
+    bot.EDUCATION: bot.edu,
+    bot.INSTRUMENTS: bot.instruments,
+    bot.EXPERIENCE: bot.experience,
+    bot.EX: bot.ex,
+    bot.MUSIC: bot.music,
+    bot.FAVS: bot.favs,
+    bot.OPINION: bot.opinion,
+    bot.GROUP: bot.group,
+    bot.FIND: bot.find,
+    bot.LINK: bot.link,
+    bot.LIKE: bot.like,
+}
+
+
+class Chat:
+    """Stands in for Update, Message and CallbackQuery of one chat."""
+
+    def __init__(self, id: int):
+        self.effective_chat = SimpleNamespace(id=id)
+        self.effective_user = SimpleNamespace(id=id, username=f"bench{id}")
+        self.message = self
+        self.callback_query = self
+        self.text: str | None = None
+        self.data: str | None = None
+        self.sent = 0
+
+    async def reply_text(self, text: str, **kwargs) -> None:
+        self.sent += 1
+
+    edit_message_text = reply_text
+
+    async def edit_message_reply_markup(self, reply_markup=None) -> None:
+        self.sent += 1
+
+    async def answer(self) -> None:
+        pass
+
+
+class Context:
+    """Stands in for CallbackContext and the Bot notifications go through."""
+
+    def __init__(self):
+        self.user_data: dict = {}
+        self.bot = self
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        pass
+
+
+def script(id: int, swipes: int) -> list[str]:
+    answers = [
+        f"Bench {id}",
+        "ВМК",
+        str(id % 6 + 1),
+        "SELF",
+        "instrument:GUITAR",
+        "instrument:BASS",
+        "instrument:DONE",
+        "5",
+        "2",
+        "Гитара, 5 лет",
+        "Рок",
+        "Muse, Radiohead",
+        "Положительное",
+        "Да",
+        "Барабанщика",
+        "https://disk.yandex.ru/d/bench",
+        replies.VIEW.value,
+    ]
+    answers.extend(
+        random.choice((replies.LIKE.value, replies.DISLIKE.value))
+        for _ in range(swipes)
+    )
+    return answers
+
+
+async def converse(id: int, swipes: int, timings: list[float]) -> int:
+    chat = Chat(id)
+    context = Context()
+
+    chat.text = "/start"
+    state = await bot.start(chat, context)
+    updates = 1
+    answers = script(id, swipes)
+    feed_from = answers.index(replies.VIEW.value)
+    for step, answer in enumerate(answers):
+        if state in (bot.EDUCATION, bot.INSTRUMENTS):
+            chat.data = answer
+        else:
+            chat.text = answer
+        started = time.perf_counter()
+        state = await HANDLERS[state](chat, context)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+        updates += 1
+        # the feed ran out, the user goes back to the menu
+        if state == bot.MAIN and step >= feed_from:
+            break
+    return updates
+
+
+async def run(users: int, swipes: int) -> None:
+    timings: list[float] = []
+    started = time.perf_counter()
+    updates = 0
+    for n in range(users):
+        updates += await converse(FIRST_ID + n, swipes, timings)
+    elapsed = time.perf_counter() - started
+    await lifecycle.drain(timeout=5)
+
+    timings.sort()
+    print(
+        f"{users} conversations, {updates} updates in {elapsed:.2f}s: "
+        f"{users / elapsed:,.0f} conversations/s, {updates / elapsed:,.0f} updates/s"
+    )
+    print(
+        f"per update: mean {statistics.mean(timings):.1f} us"
+        f"  p95 {timings[int(len(timings) * 0.95)]:.1f} us"
+        f"  max {timings[-1]:.1f} us"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--swipes", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args.users, args.swipes))
@@ -0,0 +1,216 @@
+"""Synthetic dataset for the profiles schema.
+
+Generates profiles with realistic faculty/course/education/desc distributions
+and a power-law like graph, then loads them with bulk COPY.
+
+    python -m benchmarks.dataset --profiles 50000 --reset
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+
+import asyncpg
+
+from config import get_settings
+from utils import MusicEducation, MusicInstrument
+
+
+FACULTIES = {
+    "ВМК": 14,
+    "Мехмат": 12,
+    "Физфак": 10,
+    "Химфак": 6,
+    "Биофак": 6,
+    "Экономфак": 11,
+    "Юрфак": 9,
+    "Журфак": 8,
+    "Истфак": 5,
+    "Филфак": 7,
+    "Психфак": 6,
+    "Факультет искусств": 4,
+    "ВШБ": 2,
+}
+COURSES = {1: 26, 2: 22, 3: 19, 4: 16, 5: 10, 6: 7}
+EDUCATIONS = {
+    MusicEducation.SELF: 55,
+    MusicEducation.PRIMARY: 25,
+    MusicEducation.SECONDARY: 14,
+    MusicEducation.HIGHER: 6,
+}
+INSTRUMENTS = {
+    MusicInstrument.GUITAR: 30,
+    MusicInstrument.VOCALS: 20,
+    MusicInstrument.KEYS: 14,
+    MusicInstrument.BASS: 12,
+    MusicInstrument.DRUMS: 10,
+    MusicInstrument.STRINGS: 8,
+    MusicInstrument.WINDS: 6,
+}
+
+EX = [
+    "Гитара, {years} года",
+    "Бас, {years} лет",
+    "Барабаны, {years} года",
+    "Клавиши, {years} лет, немного гитара",
+    "Вокал, {years} года",
+    "Скрипка {years} лет, сейчас электроскрипка",
+]
+MUSIC = ["Хобби", "Путь жизни", "Пока хобби, хочу большего"]
+FAVS = [
+    "Нравится: Кино, Ария, Metallica, Nirvana, Muse\nНе нравится: попса",
+    "Нравится: Radiohead, Arctic Monkeys, Земфира\nНе нравится: рэп",
+    "Нравится: Slipknot, System of a Down, Korn\nНе нравится: джаз",
+    "Нравится: Pink Floyd, King Crimson, Yes\nНе нравится: всё новое",
+]
+OPINION = ["Каверы для разогрева, дальше своё", "Только своё", "Люблю каверы"]
+GROUP = ["Нет", "Был в школьной группе", "Играю в двух коллективах"]
+FIND = ["Барабанщика", "Басиста", "Вокалиста", "Кого угодно, главное драйв"]
+
+
+def _weighted(rng: random.Random, distribution: dict, k: int) -> list:
+    return rng.choices(list(distribution), weights=list(distribution.values()), k=k)
+
+
+def _desc(rng: random.Random) -> str:
+    return f"""
+{rng.choice(EX).format(years=rng.randint(1, 12))}
+{rng.choice(MUSIC)}
+{rng.choice(FAVS)}
+{rng.choice(OPINION)}
+{rng.choice(GROUP)}
+{rng.choice(FIND)}
+"""
+
+
+def _instruments(rng: random.Random) -> dict[int, int]:
+    """Instrument id -> years, one to three instruments per profile."""
+    picked = _weighted(rng, INSTRUMENTS, rng.choice((1, 1, 1, 2, 2, 3)))
+    return {instrument.id: rng.randint(0, 12) for instrument in picked}
+
+
+def generate_profiles(
+    count: int, rng: random.Random
+) -> tuple[list[tuple], list[tuple[int, int, int]]]:
+    """Profile rows and their instrumentitems rows."""
+    ids = rng.sample(range(100_000_000, 7_000_000_000), count)
+    faculties = _weighted(rng, FACULTIES, count)
+    courses = _weighted(rng, COURSES, count)
+    educations = _weighted(rng, EDUCATIONS, count)
+    instruments = [_instruments(rng) for _ in ids]
+    profiles = [
+        (
+            id,
+            f"@user{id}",
+            f"Музыкант {n}",
+            faculties[n],
+            courses[n],
+            educations[n].name,
+            _desc(rng),
+            f"https://disk.yandex.ru/d/{id:x}",
+            sorted(instruments[n]),
+        )
+        for n, id in enumerate(ids)
+    ]
+    items = [
+        (id, instrument_id, years)
+        for id, experience in zip(ids, instruments)
+        for instrument_id, years in experience.items()
+    ]
+    return profiles, items
+
+
+def generate_likes(
+    ids: list[int], rng: random.Random, alpha: float = 1.1, mean_out: int = 15
+) -> list[tuple[int, int]]:
+    """Likes whose in-degree follows a Zipf law and out-degree a Pareto law,
+    so a few profiles collect most of the likes, like in the real feed."""
+    popularity = list(
+        itertools.accumulate(1 / (rank + 1) ** alpha for rank in range(len(ids)))
+    )
+    by_popularity = ids[:]
+    rng.shuffle(by_popularity)
+    likes = set()
+    for liker in ids:
+        out = min(int(rng.paretovariate(1.5) * mean_out / 3), len(ids) - 1)
+        for liked in rng.choices(by_popularity, cum_weights=popularity, k=out):
+            if liked != liker:
+                likes.add((liker, liked))
+    return list(likes)
+
+
+def get_dsn() -> str:
+    url = get_settings().get_db_url()
+    return url.replace("postgresql+asyncpg", "postgresql", 1)
+
+
+async def load(
+    connection: asyncpg.Connection,
+    profiles: list[tuple],
+    items: list[tuple[int, int, int]],
+    likes: list[tuple[int, int]],
+) -> None:
+    async with connection.transaction():
+        await connection.copy_records_to_table(
+            "profiles",
+            records=profiles,
+            columns=[
+                "id",
+                "username",
+                "name",
+                "faculty",
+                "course",
+                "education",
+                "desc",
+                "link",
+                "instrument_ids",
+            ],
+        )
+        await connection.copy_records_to_table(
+            "instrumentitems",
+            records=items,
+            columns=["profile_id", "instrument_id", "experience"],
+        )
+        await connection.copy_records_to_table(
+            "profilelikes", records=likes, columns=["liker_id", "liked_id"]
+        )
+    # like the nightly vacuum_analyze job: fresh statistics and a visibility
+    # map, so index-only scans don't fall back to the heap
+    await connection.execute("VACUUM (ANALYZE) profiles, profilelikes, instrumentitems")
+
+
+async def populate(count: int, seed: int = 0, reset: bool = False) -> list[int]:
+    rng = random.Random(seed)
+    profiles, items = generate_profiles(count, rng)
+    likes = generate_likes([profile[0] for profile in profiles], rng)
+
+    connection = await asyncpg.connect(get_dsn())
+    try:
+        if await connection.fetchval("SELECT count(*) FROM profiles"):
+            if not reset:
+                raise RuntimeError(
+                    "profiles is not empty, pass --reset to truncate it first"
+                )
+            await connection.execute("TRUNCATE profiles CASCADE")
+        await load(connection, profiles, items, likes)
+    finally:
+        await connection.close()
+
+    print(f"loaded {len(profiles)} profiles and {len(likes)} likes")
+    return [profile[0] for profile in profiles]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--reset", action="store_true", help="truncate existing profiles"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(populate(args.profiles, seed=args.seed, reset=args.reset))
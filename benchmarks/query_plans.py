@@ -0,0 +1,182 @@
+"""Query-plan regression suite for the bot's hot queries.
+
+Loads a synthetic dataset (see benchmarks.dataset) and runs every hot query
+under EXPLAIN (ANALYZE, BUFFERS). Exits with a non-zero status if a query
+falls back to a seq scan or exceeds its latency budget.
+
+    python -m benchmarks.query_plans --profiles 50000 --reset
+"""
+
+import asyncio
+import random
+import statistics
+import sys
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.sql import Executable
+
+from benchmarks.dataset import parse_args, populate
+from database import ProfileLike, dispose_engine, get_engine, profile_query
+from storage import PostgresStorage
+from utils import MusicInstrument
+
+
+@dataclass
+class HotQuery:
+    name: str
+    build: Callable[[int, int], Executable]
+    budget_ms: float = 5.0
+    # ORDER BY random() reads every matching row by design, only the latency
+    # is checked.
+    seq_scan_ok: bool = False
+
+
+# instruments a band typically misses, the /filter case
+WANTED_INSTRUMENTS = [MusicInstrument.BASS.id, MusicInstrument.DRUMS.id]
+
+# The statements come from the builders the bot itself uses.
+HOT_QUERIES = [
+    HotQuery("get_profile", lambda viewer, target: profile_query(viewer)),
+    HotQuery(
+        "get_liked_ids",
+        lambda viewer, target: PostgresStorage.liked_ids_query(viewer),
+    ),
+    HotQuery(
+        "get_candidate",
+        lambda viewer, target: PostgresStorage.candidate_query(viewer),
+        budget_ms=100.0,
+        seq_scan_ok=True,
+    ),
+    # A common instrument matches a good share of all profiles, so the
+    # planner may rightly prefer a seq scan over the GIN index.
+    HotQuery(
+        "get_candidate: filtered",
+        lambda viewer, target: PostgresStorage.candidate_query(
+            viewer, WANTED_INSTRUMENTS
+        ),
+        budget_ms=100.0,
+        seq_scan_ok=True,
+    ),
+    HotQuery(
+        "get_demos", lambda viewer, target: PostgresStorage.demos_query(target)
+    ),
+    HotQuery(
+        "add_like",
+        lambda viewer, target: PostgresStorage.like_statement(viewer, target),
+    ),
+    HotQuery(
+        "get_first_liker",
+        lambda viewer, target: PostgresStorage.first_liker_query(target),
+    ),
+]
+
+
+def find_seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan["Node Type"] == "Seq Scan":
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child))
+    return found
+
+
+async def explain(connection, statement: Executable) -> tuple[float, list[str]]:
+    # Parameters stay bound, as when the bot runs the statement, so the server
+    # infers their types from the columns (bigint[] for instrument ids).
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.construct_params()
+    result = await connection.exec_driver_sql(
+        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {compiled}",
+        tuple(params[name] for name in compiled.positiontup),
+    )
+    # the driver already decodes the json column
+    (report,) = result.scalar_one()
+    return (
+        report["Planning Time"] + report["Execution Time"],
+        find_seq_scans(report["Plan"]),
+    )
+
+
+async def sample_pairs(connection, samples: int) -> list[tuple[int, int]]:
+    """Viewers are drawn from the heaviest likers, targets from the most liked
+    profiles not yet liked by the viewer, which are the worst cases."""
+    viewers = (
+        await connection.execute(
+            select(ProfileLike.liker_id)
+            .group_by(ProfileLike.liker_id)
+            .order_by(func.count().desc())
+            .limit(samples)
+        )
+    ).scalars()
+    popular = (
+        await connection.execute(
+            select(ProfileLike.liked_id)
+            .group_by(ProfileLike.liked_id)
+            .order_by(func.count().desc())
+            .limit(samples * 4)
+        )
+    ).scalars().all()
+    pairs = []
+    for viewer in viewers:
+        liked = set(
+            (
+                await connection.execute(
+                    select(ProfileLike.liked_id).where(ProfileLike.liker_id == viewer)
+                )
+            ).scalars()
+        )
+        candidates = [id for id in popular if id != viewer and id not in liked]
+        if candidates:
+            pairs.append((viewer, random.choice(candidates)))
+    return pairs
+
+
+async def run_suite(samples: int = 20) -> list[str]:
+    failures = []
+    async with get_engine().connect() as connection:
+        pairs = await sample_pairs(connection, samples)
+        if not pairs:
+            raise RuntimeError("dataset has no likes to sample viewers from")
+        for query in HOT_QUERIES:
+            timings = []
+            for viewer, target in pairs:
+                # EXPLAIN ANALYZE really executes the statement, writes included.
+                async with connection.begin_nested() as savepoint:
+                    elapsed, seq_scans = await explain(
+                        connection, query.build(viewer, target)
+                    )
+                    await savepoint.rollback()
+                timings.append(elapsed)
+                if seq_scans and not query.seq_scan_ok:
+                    failures.append(
+                        f"{query.name}: seq scan on {', '.join(sorted(set(seq_scans)))}"
+                    )
+                    break
+
+            worst = max(timings)
+            print(
+                f"{query.name:<30} median {statistics.median(timings):8.3f} ms"
+                f"  max {worst:8.3f} ms  budget {query.budget_ms:6.1f} ms"
+            )
+            if worst > query.budget_ms:
+                failures.append(
+                    f"{query.name}: {worst:.3f} ms exceeds {query.budget_ms} ms budget"
+                )
+        await connection.rollback()
+    await dispose_engine()
+    return failures
+
+
+async def main() -> int:
+    args = parse_args()
+    await populate(args.profiles, seed=args.seed, reset=args.reset)
+    failures = await run_suite()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
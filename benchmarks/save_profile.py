@@ -0,0 +1,176 @@
+"""Profile save micro-benchmark: latency and database round trips per save.
+
+Compares the former get/add-or-mutate/commit/refresh path with the single
+INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement used by link(), both
+with the quick form's arguments and with the instruments and demos the
+step-by-step questionnaire sends.
+
+    python -m benchmarks.save_profile --saves 500
+"""
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+
+from sqlalchemy import delete, event, select
+
+from database import (
+    Demo,
+    InstrumentItem,
+    Profile,
+    async_session_maker,
+    dispose_engine,
+    get_engine,
+)
+from storage import PostgresStorage
+from utils import DemoKind, MusicEducation, MusicInstrument
+
+
+FIRST_ID = 9_900_000_000
+
+
+class RoundTrips:
+    """Counts statements plus BEGIN/COMMIT/ROLLBACK sent to the server;
+    transaction events on autocommit connections never reach it."""
+
+    def __init__(self):
+        self.count = 0
+
+    def statement(self, *args):
+        self.count += 1
+
+    def transaction(self, connection, *args):
+        if connection.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+            self.count += 1
+
+    def install(self, engine) -> None:
+        event.listen(engine, "before_cursor_execute", self.statement)
+        for name in ("begin", "commit", "rollback"):
+            event.listen(engine, name, self.transaction)
+
+
+def make_values(id: int, revision: int, questionnaire: bool) -> dict:
+    values = dict(
+        id=id,
+        username=f"@bench{id}",
+        name=f"Bench {revision}",
+        faculty="ВМК",
+        course=revision % 6 + 1,
+        education=MusicEducation.SELF,
+        desc=f"revision {revision}",
+        link="https://disk.yandex.ru/d/bench",
+    )
+    if questionnaire:
+        # the update drops an instrument and the demo, like a user who
+        # fills the questionnaire in again
+        values["experience"] = {MusicInstrument.GUITAR.id: 5 + revision}
+        values["demos"] = []
+        if revision == 0:
+            values["experience"][MusicInstrument.BASS.id] = 2
+            values["demos"].append(
+                dict(
+                    kind=DemoKind.VOICE,
+                    file_id=f"bench-{id}",
+                    file_unique_id=f"bench-{id}",
+                    duration=30,
+                )
+            )
+    return values
+
+
+async def legacy_save(
+    experience: dict[int, int] | None = None,
+    demos: list[dict] | None = None,
+    **values,
+) -> Profile:
+    if experience is not None:
+        values["instrument_ids"] = sorted(experience)
+    async with async_session_maker() as session:
+        profile = await session.get(Profile, values["id"])
+        if profile is None:
+            profile = Profile(**values)
+            session.add(profile)
+        else:
+            for key, value in values.items():
+                if key not in ("id", "username"):
+                    setattr(profile, key, value)
+        if experience is not None:
+            await session.execute(
+                delete(InstrumentItem).where(InstrumentItem.profile_id == values["id"])
+            )
+            session.add_all(
+                InstrumentItem(
+                    profile_id=values["id"], instrument_id=id, experience=years
+                )
+                for id, years in experience.items()
+            )
+        if demos is not None:
+            await session.execute(delete(Demo).where(Demo.profile_id == values["id"]))
+            session.add_all(Demo(profile_id=values["id"], **demo) for demo in demos)
+        await session.commit()
+        await session.refresh(profile)
+    return profile
+
+
+async def measure(
+    save, ids: range, questionnaire: bool, counter: RoundTrips
+) -> tuple[list[float], float]:
+    timings = []
+    counter.count = 0
+    # every profile is saved twice: once inserted, once updated
+    for revision in range(2):
+        for id in ids:
+            started = time.perf_counter()
+            await save(**make_values(id, revision, questionnaire))
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings, counter.count / len(timings)
+
+
+async def check_free(ids: range) -> None:
+    """Refuses to run if any of the benchmark's ids belong to a real profile,
+    it would be overwritten and then deleted."""
+    async with async_session_maker() as session:
+        taken = await session.scalar(
+            select(Profile.id).where(Profile.id.in_(ids)).limit(1)
+        )
+    if taken is not None:
+        raise SystemExit(f"profile {taken} already exists, refusing to run")
+
+
+async def cleanup(ids: range) -> None:
+    """Deletes only the profiles the benchmark saved."""
+    async with async_session_maker() as session:
+        await session.execute(delete(Profile).where(Profile.id.in_(ids)))
+        await session.commit()
+
+
+async def main(saves: int) -> None:
+    ids = range(FIRST_ID, FIRST_ID + saves // 2)
+    await check_free(ids)
+    counter = RoundTrips()
+    counter.install(get_engine().sync_engine)
+
+    paths = (
+        ("get/commit/refresh", legacy_save),
+        ("upsert", PostgresStorage().upsert_profile),
+    )
+    forms = (("quick form", False), ("questionnaire", True))
+    for (path, save), (form, questionnaire) in itertools.product(paths, forms):
+        await cleanup(ids)
+        timings, round_trips = await measure(save, ids, questionnaire, counter)
+        timings.sort()
+        print(
+            f"{path:<20} {form:<14} mean {statistics.mean(timings):7.3f} ms"
+            f"  p95 {timings[int(len(timings) * 0.95)]:7.3f} ms"
+            f"  round trips/save {round_trips:.1f}"
+        )
+    await cleanup(ids)
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--saves", type=int, default=500)
+    asyncio.run(main(parser.parse_args().saves))
@@ -0,0 +1,69 @@
+"""Cold-start benchmark based on `python -X importtime`.
+
+Imports the given module in fresh interpreters and reports the wall time and
+the heaviest imports, so regressions in startup cost show up before deploy.
+
+    python -m benchmarks.startup --module main --runs 5
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+def import_once(module: str) -> tuple[float, dict[str, int]]:
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    # import time: self [us] | cumulative | imported package
+    # A module is reported after everything it imported, each nesting level
+    # indents the package name by two more spaces. The direct imports of
+    # `module` are the level 1 lines right before its own level 0 line.
+    children: dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, package = line.removeprefix("import time:").split("|")
+        name = package.strip()
+        level = (len(package) - len(package.lstrip()) - 1) // 2
+        if level == 1:
+            children[name] = int(cumulative_us)
+        elif level == 0:
+            if name == module:
+                return elapsed, children
+            children = {}
+    return elapsed, {}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    timings = []
+    imports = {}
+    for _ in range(args.runs):
+        elapsed, imports = import_once(args.module)
+        timings.append(elapsed)
+
+    print(
+        f"import {args.module}: median {statistics.median(timings) * 1000:.1f} ms, "
+        f"min {min(timings) * 1000:.1f} ms over {args.runs} runs"
+    )
+    print(f"heaviest direct imports of {args.module} (last run):")
+    for name, us in sorted(imports.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Async read-through cache with pluggable backends.
+
+    cache = ReadThroughCache(load_profile, MemoryBackend(maxsize=10_000), ttl=300)
+    profile = await cache.get(chat_id)
+    await cache.set(chat_id, profile)  # from the save path
+
+Concurrent misses for the same key share one load (single flight). Missing
+rows are cached too, loaders return None for them.
+"""
+
+import asyncio
+import pickle
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+MISS = object()
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: Hashable) -> Any:
+        """Returns the cached value or MISS."""
+
+    @abstractmethod
+    async def set(self, key: Hashable, value: Any, ttl: float) -> None: ...
+
+    @abstractmethod
+    async def delete(self, key: Hashable) -> None: ...
+
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISS
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return MISS
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend(CacheBackend):
+    """Any Redis-compatible server, shared between bot processes. Eviction is
+    left to the server's maxmemory policy."""
+
+    def __init__(self, url: str, prefix: str = "cache:"):
+        try:
+            from redis import asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RedisBackend requires the redis package") from e
+        self._client = redis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: Hashable) -> Any:
+        raw = await self._client.get(f"{self._prefix}{key}")
+        return MISS if raw is None else pickle.loads(raw)
+
+    async def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        await self._client.set(
+            f"{self._prefix}{key}", pickle.dumps(value), px=int(ttl * 1000)
+        )
+
+    async def delete(self, key: Hashable) -> None:
+        await self._client.delete(f"{self._prefix}{key}")
+
+
+def create_backend(url: str | None, maxsize: int, prefix: str) -> CacheBackend:
+    if url is None:
+        return MemoryBackend(maxsize=maxsize)
+    return RedisBackend(url, prefix=prefix)
+
+
+class ReadThroughCache:
+    def __init__(
+        self,
+        loader: Callable[[Hashable], Awaitable[Any]],
+        backend: CacheBackend,
+        ttl: float = 300,
+    ):
+        self._loader = loader
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        # bumped on every write, a load that started before it is not stored
+        self._versions: dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: Hashable) -> Any:
+        value = await self.backend.get(key)
+        if value is not MISS:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # nobody may be waiting when the load fails
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        version = self._versions.get(key)
+        try:
+            value = await self._loader(key)
+            if self._versions.get(key) == version:
+                await self.backend.set(key, value, self.ttl)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            del self._inflight[key]
+            self._versions.pop(key, None)
+        return value
+
+    def _bump(self, key: Hashable) -> None:
+        if key in self._inflight:
+            self._versions[key] = self._versions.get(key, 0) + 1
+        else:
+            self._versions.pop(key, None)
+
+    async def set(self, key: Hashable, value: Any) -> None:
+        """Replaces the entry after a write, so readers don't reload it."""
+        self._bump(key)
+        await self.backend.set(key, value, self.ttl)
+
+    async def invalidate(self, key: Hashable) -> None:
+        self._bump(key)
+        await self.backend.delete(key)
@@ -1,4 +1,7 @@
 import os
+from functools import lru_cache
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,6 +12,57 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str
     POSTGRES_PORT: int
 
+    # read-only paths go to these, e.g. ["postgresql+asyncpg://u:p@replica/db"]
+    POSTGRES_REPLICA_URLS: list[str] = []
+    # reads of a chat stay on the primary this long after it writes
+    REPLICA_STICKY_SECONDS: float = 5.0
+
+    WEBAPP_URL: str | None = None
+
+    # "memory" runs the handlers without a database, see storage
+    STORAGE_BACKEND: Literal["postgres", "memory"] = "postgres"
+
+    # redis://... to share the cache between processes, in-process otherwise
+    PROFILE_CACHE_URL: str | None = None
+    PROFILE_CACHE_TTL: float = 300
+    PROFILE_CACHE_SIZE: int = 10_000
+
+    # demos sent to the bot instead of a link
+    MAX_DEMOS: int = 10
+    # ready-to-send demo messages, always in-process
+    DEMO_CACHE_TTL: float = 600
+    DEMO_CACHE_SIZE: int = 10_000
+
+    # background jobs
+    OFF_PEAK_HOUR: int = 4  # UTC
+    DECK_SIZE: int = 50
+    STALE_CONVERSATION_SECONDS: float = 24 * 60 * 60
+
+    # like notifications
+    DIGEST_HOUR: int = 9  # UTC
+    NOTIFICATION_RATE: float = 25  # messages per second
+
+    # duplicate updates and actions are dropped within this window
+    DEDUP_WINDOW_SECONDS: float = 10
+    DEDUP_SIZE: int = 10_000
+    # share idempotency keys between workers through the database
+    DEDUP_USE_DATABASE: bool = False
+
+    # token buckets: burst size and refill per second, per chat and overall
+    RATE_LIMIT_BURST: float = 10
+    RATE_LIMIT_PER_SECOND: float = 1
+    GLOBAL_RATE_LIMIT_BURST: float = 200
+    GLOBAL_RATE_LIMIT_PER_SECOND: float = 50
+    RATE_LIMIT_CHATS: int = 10_000
+
+    # Telegram user ids allowed to run /stats
+    ADMIN_IDS: list[int] = []
+    STATS_REFRESH_SECONDS: float = 300
+
+    # time left on shutdown for running jobs and pending notifications
+    # together, keep it below stop_grace_period in docker-compose.yml
+    SHUTDOWN_GRACE_SECONDS: float = 20
+
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"),
         extra="ignore",
@@ -21,4 +75,13 @@ class Settings(BaseSettings):
         )
 
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+
+def __getattr__(name: str):
+    # `settings` is built on first access so importing config doesn't read .env
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
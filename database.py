@@ -1,6 +1,25 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
 from typing import Annotated
 
-from sqlalchemy import ForeignKey, String, Text, CheckConstraint, BigInteger
+from sqlalchemy import (
+    ForeignKey,
+    String,
+    Text,
+    CheckConstraint,
+    BigInteger,
+    DateTime,
+    Index,
+    Select,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
@@ -8,17 +27,130 @@ from sqlalchemy.orm import (
     mapped_column,
     relationship,
 )
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import (
+    AsyncAttrs,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from cache import ReadThroughCache, create_backend
+from config import get_settings
+from utils import INSTRUMENTS_BY_ID, DemoKind, MusicEducation, NotificationMode
+
+
+_engine: AsyncEngine | None = None
+
+
+def get_engine() -> AsyncEngine:
+    """The engine is created on first use, so importing this module doesn't
+    read settings or load the driver."""
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(url=get_settings().get_db_url())
+    return _engine
+
 
-from config import settings
-from utils import MusicEducation
+class LazySessionMaker(async_sessionmaker[AsyncSession]):
+    def __call__(self, **local_kw) -> AsyncSession:
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
 
 
-DATABASE_URL = settings.get_db_url()
+async_session_maker = LazySessionMaker(expire_on_commit=False)
 
 
-engine = create_async_engine(url=DATABASE_URL)
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+_replicas: list[AsyncEngine] | None = None
+_next_replica = itertools.count()
+# chat id -> time of its last write, oldest first
+_recent_writes: OrderedDict[int, float] = OrderedDict()
+
+
+def get_replica_engines() -> list[AsyncEngine]:
+    global _replicas
+    if _replicas is None:
+        _replicas = [
+            create_async_engine(url=url)
+            for url in get_settings().POSTGRES_REPLICA_URLS
+        ]
+    return _replicas
+
+
+def mark_written(chat_id: int) -> None:
+    """Pins the chat's reads to the primary for a short while, so it reads its
+    own writes while the replicas catch up."""
+    now = time.monotonic()
+    _recent_writes[chat_id] = now
+    _recent_writes.move_to_end(chat_id)
+    window = get_settings().REPLICA_STICKY_SECONDS
+    while _recent_writes:
+        oldest, written_at = next(iter(_recent_writes.items()))
+        if now - written_at < window:
+            break
+        del _recent_writes[oldest]
+
+
+def _is_sticky(chat_id: int | None) -> bool:
+    written_at = _recent_writes.get(chat_id)
+    return (
+        written_at is not None
+        and time.monotonic() - written_at < get_settings().REPLICA_STICKY_SECONDS
+    )
+
+
+def read_session(chat_id: int | None = None) -> AsyncSession:
+    """Session for read-only work: a replica, round robin, unless there are
+    none or the chat has just written. Writes use async_session_maker()."""
+    replicas = get_replica_engines()
+    if not replicas or _is_sticky(chat_id):
+        return async_session_maker()
+    return async_session_maker(bind=replicas[next(_next_replica) % len(replicas)])
+
+
+async def warm_up(connections: int = 5) -> None:
+    """Opens pool connections in parallel ahead of the first update."""
+
+    async def ping() -> None:
+        async with get_engine().connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(connections)))
+
+
+async def dispose_engine() -> None:
+    global _engine, _replicas
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        async_session_maker.kw.pop("bind", None)
+    if _replicas is not None:
+        await asyncio.gather(*(replica.dispose() for replica in _replicas))
+        _replicas = None
+
+
+def profile_query(id: int) -> Select:
+    return select(Profile).where(Profile.id == id)
+
+
+async def load_profile(id: int):
+    async with read_session(id) as session:
+        return (await session.execute(profile_query(id))).scalar_one_or_none()
+
+
+@lru_cache
+def get_profile_cache() -> ReadThroughCache:
+    settings = get_settings()
+    return ReadThroughCache(
+        load_profile,
+        create_backend(
+            settings.PROFILE_CACHE_URL,
+            maxsize=settings.PROFILE_CACHE_SIZE,
+            prefix="profile:",
+        ),
+        ttl=settings.PROFILE_CACHE_TTL,
+    )
 
 
 int_pk = Annotated[int, mapped_column(BigInteger, primary_key=True)]
@@ -41,6 +173,69 @@ class ProfileLike(Base):
     liked_id: Mapped[int] = mapped_column(
         ForeignKey("profiles.id", ondelete="CASCADE"), primary_key=True
     )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+    __table_args__ = (
+        Index("ix_profilelikes_liked_id_created_at", "liked_id", "created_at"),
+    )
+
+
+class ProcessedUpdate(Base):
+    """Idempotency keys shared between workers, see idempotency."""
+
+    key: Mapped[str] = mapped_column(String(200), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
+
+class Instrument(Base):
+    """Fixed catalog, seeded by its migration, see utils.MusicInstrument."""
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String(100), unique=True)
+
+
+class InstrumentItem(Base):
+    profile_id: Mapped[int] = mapped_column(
+        ForeignKey("profiles.id", ondelete="CASCADE"), primary_key=True
+    )
+    instrument_id: Mapped[int] = mapped_column(
+        ForeignKey("instruments.id", ondelete="CASCADE"), primary_key=True
+    )
+    # years
+    experience: Mapped[int]
+
+    __table_args__ = (
+        Index(
+            "ix_instrumentitems_instrument_id_experience",
+            "instrument_id",
+            "experience",
+        ),
+    )
+
+
+class Demo(Base):
+    """A voice, audio or video message sent as a demo. Only Telegram's file_id
+    is kept, cards re-send the file by it without downloading anything."""
+
+    id: Mapped[int_pk]
+    profile_id: Mapped[int] = mapped_column(
+        ForeignKey("profiles.id", ondelete="CASCADE"), index=True
+    )
+    kind: Mapped[DemoKind]
+    file_id: Mapped[str] = mapped_column(String(200))
+    file_unique_id: Mapped[str] = mapped_column(String(100))
+    duration: Mapped[int | None]
+    mime_type: Mapped[str | None] = mapped_column(String(100))
+    file_size: Mapped[int | None] = mapped_column(BigInteger)
+    # "performer - title" of audio files
+    title: Mapped[str | None] = mapped_column(String(200))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
 
 
 class Profile(Base):
@@ -52,6 +247,14 @@ class Profile(Base):
     education: Mapped[MusicEducation] = mapped_column(default=MusicEducation.SELF)
     desc: Mapped[str] = mapped_column(Text)
     link: Mapped[str] = mapped_column(String(200))
+    notifications: Mapped[NotificationMode] = mapped_column(
+        default=NotificationMode.INSTANT, server_default=NotificationMode.INSTANT.name
+    )
+    digest_sent_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    # copy of the profile's instrumentitems ids for containment queries
+    instrument_ids: Mapped[list[int]] = mapped_column(
+        ARRAY(BigInteger), default=list, server_default="{}"
+    )
     likes: Mapped[list["Profile"]] = relationship(
         "Profile",
         secondary="profilelikes",
@@ -67,9 +270,20 @@ class Profile(Base):
         back_populates="likes",
     )
 
+    __table_args__ = (
+        Index("ix_profiles_instrument_ids", "instrument_ids", postgresql_using="gin"),
+    )
+
     def __repr__(self) -> str:
+        instruments = ""
+        if self.instrument_ids:
+            instruments = "\nинструменты - " + ", ".join(
+                INSTRUMENTS_BY_ID[id].title for id in self.instrument_ids
+            )
+        # profiles with demos only have no link
+        link = f"\n<ссылка:{self.link}>" if self.link else ""
         return (
             f"{self.name}\nфакультет - '{self.faculty}', "
             f"курс - {self.course}, музыкальное образование - {self.education.value}"
-            f"\n{self.desc}\n<ссылка:{self.link}>"
+            f"{instruments}\n{self.desc}{link}"
         )
@@ -0,0 +1,117 @@
+"""Demos: voice, audio and video messages attached to a profile.
+
+Only Telegram's file_id and a bit of metadata are stored (database.Demo),
+cards re-send the files by file_id, so nothing is downloaded or uploaded
+again. The messages that show a profile's demos are built once and kept in
+an in-process cache. Audio files go out as one media group and videos as
+another, Telegram doesn't mix the two and doesn't group voice messages at
+all. The card text becomes the caption of the last demo message when it
+fits and that message isn't a group (groups can't carry a keyboard), so a
+card with one demo costs one API call and a card with a group two.
+"""
+
+from datetime import timedelta
+from functools import lru_cache
+
+from telegram import InputMediaAudio, InputMediaVideo, Message
+
+from cache import MemoryBackend, ReadThroughCache
+from config import get_settings
+from database import Demo
+from storage import get_storage
+from utils import DemoKind
+
+
+CAPTION_LIMIT = 1024
+MEDIA_GROUP_LIMIT = 10
+
+# (Message.reply_* method suffix, its keyword arguments)
+DemoMessage = tuple[str, dict]
+
+GROUPED = (
+    (DemoKind.AUDIO, InputMediaAudio, "audio"),
+    (DemoKind.VIDEO, InputMediaVideo, "video"),
+)
+
+
+def demo_from_message(message: Message) -> dict | None:
+    """Demo columns for a voice, audio or video message."""
+    title = None
+    if message.voice is not None:
+        kind, file = DemoKind.VOICE, message.voice
+    elif message.audio is not None:
+        kind, file = DemoKind.AUDIO, message.audio
+        title = " - ".join(filter(None, (file.performer, file.title))) or None
+    elif message.video is not None:
+        kind, file = DemoKind.VIDEO, message.video
+    else:
+        return None
+
+    duration = file.duration
+    if isinstance(duration, timedelta):
+        duration = int(duration.total_seconds())
+    return dict(
+        kind=kind,
+        file_id=file.file_id,
+        file_unique_id=file.file_unique_id,
+        duration=duration,
+        mime_type=file.mime_type,
+        file_size=file.file_size,
+        title=title,
+    )
+
+
+def build_demo_messages(demos: list[Demo]) -> list[DemoMessage]:
+    messages = []
+    for kind, media_type, method in GROUPED:
+        file_ids = [demo.file_id for demo in demos if demo.kind is kind]
+        for start in range(0, len(file_ids), MEDIA_GROUP_LIMIT):
+            chunk = file_ids[start : start + MEDIA_GROUP_LIMIT]
+            if len(chunk) == 1:
+                messages.append((method, {method: chunk[0]}))
+            else:
+                messages.append(
+                    ("media_group", {"media": [media_type(id) for id in chunk]})
+                )
+    messages.extend(
+        ("voice", {"voice": demo.file_id})
+        for demo in demos
+        if demo.kind is DemoKind.VOICE
+    )
+    return messages
+
+
+async def load_demo_messages(profile_id: int) -> list[DemoMessage]:
+    return build_demo_messages(await get_storage().get_demos(profile_id))
+
+
+@lru_cache
+def get_demo_cache() -> ReadThroughCache:
+    settings = get_settings()
+    return ReadThroughCache(
+        load_demo_messages,
+        # InputMedia objects are only good for this process
+        MemoryBackend(maxsize=settings.DEMO_CACHE_SIZE),
+        ttl=settings.DEMO_CACHE_TTL,
+    )
+
+
+async def send_card(message: Message, profile_id: int, card: dict) -> None:
+    """Replies with the profile's demos followed by `card`, a rendered
+    template."""
+    demo_messages = await get_demo_cache().get(profile_id)
+    if not demo_messages:
+        await message.reply_text(**card)
+        return
+
+    *first, (method, kwargs) = demo_messages
+    for first_method, first_kwargs in first:
+        await getattr(message, f"reply_{first_method}")(**first_kwargs)
+    if method != "media_group" and len(card["text"]) <= CAPTION_LIMIT:
+        options = {key: value for key, value in card.items() if key != "text"}
+        await getattr(message, f"reply_{method}")(
+            **kwargs, caption=card["text"], **options
+        )
+        return
+    await getattr(message, f"reply_{method}")(**kwargs)
+    await message.reply_text(**card)
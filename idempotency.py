@@ -0,0 +1,109 @@
+"""Drops duplicate work before it reaches the database or the Telegram API.
+
+Polling retries and double taps deliver the same update or the same action
+twice. Keys are remembered for a short window:
+
+* ("update", update_id) - checked for every update by drop_duplicate_updates;
+* ("like", chat_id, target) and similar - checked by handlers via claim().
+
+A bounded in-memory LRU covers a single process. With DEDUP_USE_DATABASE the
+keys are claimed in the processedupdates table instead, so several workers
+share them.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import TYPE_CHECKING, Hashable
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+
+from config import get_settings
+from database import ProcessedUpdate, async_session_maker
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
+
+
+class Deduplicator:
+    """LRU of keys seen within `window` seconds, at most `maxsize` of them."""
+
+    def __init__(self, window: float, maxsize: int):
+        self.window = window
+        self.maxsize = maxsize
+        self._seen: OrderedDict[Hashable, float] = OrderedDict()
+        self.dropped = 0
+
+    async def claim(self, key: Hashable) -> bool:
+        """True the first time a key is seen within the window."""
+        now = time.monotonic()
+        seen_at = self._seen.get(key)
+        if seen_at is not None and now - seen_at < self.window:
+            self.dropped += 1
+            return False
+        self._seen[key] = now
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.maxsize:
+            self._seen.popitem(last=False)
+        return True
+
+
+class DatabaseDeduplicator(Deduplicator):
+    """Claims keys in processedupdates, shared by all workers. The local LRU
+    still answers repeats within this process without a round trip."""
+
+    async def claim(self, key: Hashable) -> bool:
+        if not await super().claim(key):
+            return False
+        now = datetime.now(timezone.utc)
+        async with async_session_maker() as session:
+            # an expired claim is taken over, a live one is left alone
+            stmt = insert(ProcessedUpdate).values(key=_serialize(key), created_at=now)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ProcessedUpdate.key],
+                set_={"created_at": now},
+                where=ProcessedUpdate.created_at
+                < now - timedelta(seconds=self.window),
+            ).returning(ProcessedUpdate.key)
+            claimed = await session.scalar(stmt)
+            await session.commit()
+        if claimed is None:
+            self.dropped += 1
+        return claimed is not None
+
+    async def prune(self) -> None:
+        deadline = datetime.now(timezone.utc) - timedelta(seconds=self.window)
+        async with async_session_maker() as session:
+            await session.execute(
+                delete(ProcessedUpdate).where(ProcessedUpdate.created_at < deadline)
+            )
+            await session.commit()
+
+
+def _serialize(key: Hashable) -> str:
+    if isinstance(key, tuple):
+        return ":".join(map(str, key))
+    return str(key)
+
+
+@lru_cache
+def get_deduplicator() -> Deduplicator:
+    settings = get_settings()
+    cls = DatabaseDeduplicator if settings.DEDUP_USE_DATABASE else Deduplicator
+    return cls(window=settings.DEDUP_WINDOW_SECONDS, maxsize=settings.DEDUP_SIZE)
+
+
+async def claim(*key: Hashable) -> bool:
+    return await get_deduplicator().claim(key)
+
+
+async def drop_duplicate_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    from telegram.ext import ApplicationHandlerStop
+
+    if not await claim("update", update.update_id):
+        raise ApplicationHandlerStop
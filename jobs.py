@@ -0,0 +1,294 @@
+"""Periodic background jobs on the application's JobQueue.
+
+Heavy work is moved out of interactive handlers:
+
+* refresh_recommendation_index - ids of all profiles, the pool decks are
+  drawn from;
+* precompute_decks - a shuffled deck of not yet liked candidates for every
+  recently active chat, built off-peak; view_musician pops from it instead
+  of sorting the whole table by random();
+* prune_conversations - drops state of users that went quiet;
+* vacuum_analyze - VACUUM (ANALYZE) of the hot tables, off-peak;
+* hourly_digest, daily_digest - like digests, see notifications;
+* prune_processed_updates - expired idempotency keys, in multi-worker mode;
+* refresh_stats - the profilestats view and its snapshot behind /stats;
+* report_metrics - logs cache, deduplication and rate limiting counters.
+
+Every job records run-time metrics and is skipped while its previous run is
+still going.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import functools
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from sqlalchemy import BigInteger, any_, bindparam, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from config import get_settings
+from database import (
+    Profile,
+    ProfileLike,
+    get_engine,
+    get_profile_cache,
+    read_session,
+)
+from demos import get_demo_cache
+from idempotency import DatabaseDeduplicator, get_deduplicator
+from notifications import send_digests
+from ratelimit import get_rate_limiter
+from stats import refresh_snapshot
+from utils import NotificationMode
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import Application, ContextTypes
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobMetrics:
+    runs: int = 0
+    skipped: int = 0
+    failures: int = 0
+    last_duration: float = 0.0
+    total_duration: float = 0.0
+    last_finished: float | None = None
+
+
+METRICS: dict[str, JobMetrics] = {}
+
+# prune_conversations waits this much past the conversation timeout, so the
+# timeout job has surely ended the conversation first
+CONVERSATION_TIMEOUT_MARGIN = 60
+
+# how often a running job checks whether the application is stopping
+SHUTDOWN_POLL_SECONDS = 1
+# time.monotonic() by which running jobs and pending work must be done
+_shutdown_deadline: float | None = None
+
+# chat id -> last time an update came from it
+last_seen: dict[int, float] = {}
+recommendation_index: list[int] = []
+# chat id -> candidate profile ids, popped from the end
+decks: dict[int, list[int]] = {}
+
+
+def shutdown_time_left() -> float:
+    """Seconds left of the single SHUTDOWN_GRACE_SECONDS budget shared by
+    running jobs and lifecycle.drain(). The budget starts with the first
+    call, made once the application has stopped running."""
+    global _shutdown_deadline
+    if _shutdown_deadline is None:
+        _shutdown_deadline = time.monotonic() + get_settings().SHUTDOWN_GRACE_SECONDS
+    return max(0.0, _shutdown_deadline - time.monotonic())
+
+
+async def run_until_shutdown(work: Awaitable[None], application: Application) -> None:
+    """Awaits `work`. Once the application stops, it is cancelled when the
+    shutdown budget runs out, since JobQueue.stop() waits for running jobs
+    without a deadline."""
+    task = asyncio.ensure_future(work)
+    while application.running:
+        done, _ = await asyncio.wait({task}, timeout=SHUTDOWN_POLL_SECONDS)
+        if done:
+            return task.result()
+    await asyncio.wait_for(task, shutdown_time_left())
+
+
+def periodic(
+    job: Callable[[ContextTypes.DEFAULT_TYPE], Awaitable[None]],
+) -> Callable[[ContextTypes.DEFAULT_TYPE], Awaitable[None]]:
+    """Adds overlap protection, run-time metrics and the shutdown deadline to
+    a job callback."""
+    name = job.__name__
+    metrics = METRICS[name] = JobMetrics()
+    lock = asyncio.Lock()
+
+    @functools.wraps(job)
+    async def wrapper(context: ContextTypes.DEFAULT_TYPE) -> None:
+        if lock.locked():
+            metrics.skipped += 1
+            logger.warning("job %s is still running, skipping this run", name)
+            return
+        async with lock:
+            started = time.perf_counter()
+            try:
+                await run_until_shutdown(job(context), context.application)
+            except asyncio.TimeoutError:
+                metrics.failures += 1
+                logger.warning("job %s cancelled at shutdown", name)
+            except Exception:
+                metrics.failures += 1
+                logger.exception("job %s failed", name)
+            finally:
+                metrics.runs += 1
+                metrics.last_duration = time.perf_counter() - started
+                metrics.total_duration += metrics.last_duration
+                metrics.last_finished = time.time()
+                logger.info("job %s took %.3fs", name, metrics.last_duration)
+
+    return wrapper
+
+
+async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_chat is not None:
+        last_seen[update.effective_chat.id] = time.time()
+
+
+def pop_candidate(chat_id: int, exclude: set[int]) -> int | None:
+    deck = decks.get(chat_id)
+    while deck:
+        candidate = deck.pop()
+        if candidate not in exclude:
+            return candidate
+    decks.pop(chat_id, None)
+    return None
+
+
+@periodic
+async def refresh_recommendation_index(context: ContextTypes.DEFAULT_TYPE):
+    async with read_session() as session:
+        recommendation_index[:] = await session.scalars(select(Profile.id))
+
+
+@periodic
+async def precompute_decks(context: ContextTypes.DEFAULT_TYPE):
+    """Decks are built for chats seen recently, from the recommendation index
+    minus what they already liked."""
+    size = get_settings().DECK_SIZE
+    active = list(last_seen)
+    if not active or not recommendation_index:
+        return
+
+    likes: dict[int, set[int]] = {}
+    async with read_session() as session:
+        for liker_id, liked_id in await session.execute(
+            select(ProfileLike.liker_id, ProfileLike.liked_id).where(
+                ProfileLike.liker_id
+                == any_(bindparam("active", active, type_=ARRAY(BigInteger)))
+            )
+        ):
+            likes.setdefault(liker_id, set()).add(liked_id)
+
+    for chat_id in active:
+        liked = likes.get(chat_id, set())
+        # oversample so that enough is left after dropping liked profiles
+        sample = random.sample(
+            recommendation_index,
+            min(len(recommendation_index), size + len(liked) + 1),
+        )
+        decks[chat_id] = [
+            id for id in sample if id != chat_id and id not in liked
+        ][:size]
+        # a big audience must not block the event loop for the whole run
+        await asyncio.sleep(0)
+
+
+@periodic
+async def prune_conversations(context: ContextTypes.DEFAULT_TYPE):
+    """Conversations of these chats have already timed out (the
+    ConversationHandler's conversation_timeout is the same setting), so no
+    handler is left that expects their user_data."""
+    deadline = (
+        time.time()
+        - get_settings().STALE_CONVERSATION_SECONDS
+        - CONVERSATION_TIMEOUT_MARGIN
+    )
+    stale = [chat_id for chat_id, seen in last_seen.items() if seen < deadline]
+    for chat_id in stale:
+        del last_seen[chat_id]
+        decks.pop(chat_id, None)
+        # private chats: the user id is the chat id
+        context.application.drop_user_data(chat_id)
+        context.application.drop_chat_data(chat_id)
+    logger.info("pruned state of %s inactive chats", len(stale))
+
+
+@periodic
+async def vacuum_analyze(context: ContextTypes.DEFAULT_TYPE):
+    # VACUUM can't run inside a transaction block
+    async with get_engine().connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.execute(text("VACUUM (ANALYZE) profiles, profilelikes"))
+
+
+@periodic
+async def hourly_digest(context: ContextTypes.DEFAULT_TYPE):
+    await send_digests(context.bot, NotificationMode.HOURLY)
+
+
+@periodic
+async def daily_digest(context: ContextTypes.DEFAULT_TYPE):
+    await send_digests(context.bot, NotificationMode.DAILY)
+
+
+@periodic
+async def prune_processed_updates(context: ContextTypes.DEFAULT_TYPE):
+    await get_deduplicator().prune()
+
+
+@periodic
+async def refresh_stats(context: ContextTypes.DEFAULT_TYPE):
+    await refresh_snapshot()
+
+
+def log_metrics() -> None:
+    cache = get_profile_cache()
+    demo_cache = get_demo_cache()
+    rate_limit = get_rate_limiter().metrics
+    logger.info(
+        "profile cache: %s hits, %s misses; demo cache: %s hits, %s misses; "
+        "duplicates dropped: %s; "
+        "updates allowed: %s, throttled per chat: %s, throttled globally: %s",
+        cache.hits,
+        cache.misses,
+        demo_cache.hits,
+        demo_cache.misses,
+        get_deduplicator().dropped,
+        rate_limit.allowed,
+        rate_limit.throttled_chat,
+        rate_limit.throttled_global,
+    )
+    for name, metrics in METRICS.items():
+        logger.info("job %s: %s", name, metrics)
+
+
+@periodic
+async def report_metrics(context: ContextTypes.DEFAULT_TYPE):
+    log_metrics()
+
+
+def register_jobs(app: Application) -> None:
+    settings = get_settings()
+    off_peak = datetime.time(
+        hour=settings.OFF_PEAK_HOUR, tzinfo=datetime.timezone.utc
+    )
+    queue = app.job_queue
+
+    queue.run_repeating(refresh_recommendation_index, interval=600, first=0)
+    queue.run_daily(precompute_decks, time=off_peak)
+    # the first deck is built right after the index, not a day later
+    queue.run_once(precompute_decks, when=60)
+    queue.run_repeating(prune_conversations, interval=3600, first=3600)
+    queue.run_daily(vacuum_analyze, time=off_peak.replace(minute=30))
+    queue.run_repeating(hourly_digest, interval=3600, first=3600)
+    queue.run_daily(
+        daily_digest,
+        time=datetime.time(hour=settings.DIGEST_HOUR, tzinfo=datetime.timezone.utc),
+    )
+    queue.run_repeating(
+        refresh_stats, interval=settings.STATS_REFRESH_SECONDS, first=30
+    )
+    queue.run_repeating(report_metrics, interval=600, first=600)
+    if isinstance(get_deduplicator(), DatabaseDeduplicator):
+        queue.run_repeating(prune_processed_updates, interval=60, first=60)
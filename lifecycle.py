@@ -0,0 +1,79 @@
+"""Application lifecycle: warm-up on start, drain and cleanup on stop.
+
+Handlers hand fire-and-forget work (notifications to other chats) to
+lifecycle.track() instead of awaiting it. On shutdown that work is drained
+with a deadline; after PTB has flushed its persistence, metrics are logged
+and the database engines are disposed, so a restart doesn't cut off half-sent
+notifications or leave connections hanging. Running jobs and the drain
+share one deadline, see jobs.shutdown_time_left().
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Awaitable
+
+from database import dispose_engine, warm_up
+from jobs import log_metrics, shutdown_time_left
+
+if TYPE_CHECKING:
+    from telegram.ext import Application
+
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    def __init__(self):
+        self._pending: set[asyncio.Task] = set()
+        self.draining = False
+
+    def track(self, work: Awaitable) -> asyncio.Task | None:
+        """Runs `work` in the background until drain(). Work handed over
+        while draining is refused, nothing would wait for it."""
+        if self.draining:
+            logger.warning("refused background work while draining: %r", work)
+            if asyncio.iscoroutine(work):
+                work.close()
+            return None
+        task = asyncio.ensure_future(work)
+        self._pending.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("background work failed", exc_info=task.exception())
+
+    async def drain(self, timeout: float) -> None:
+        self.draining = True
+        if not self._pending:
+            return
+        logger.info("draining %s pending tasks", len(self._pending))
+        _, still_pending = await asyncio.wait(self._pending, timeout=timeout)
+        for task in still_pending:
+            task.cancel()
+        if still_pending:
+            logger.warning(
+                "cancelled %s tasks after %ss deadline", len(still_pending), timeout
+            )
+
+    async def post_init(self, app: Application) -> None:
+        # Pool connections are opened while polling starts instead of on the
+        # first update.
+        app.create_task(warm_up())
+
+    async def post_stop(self, app: Application) -> None:
+        # Polling and update processing have stopped, the bot can still send.
+        # Jobs that were running at stop already used up part of the budget.
+        await self.drain(shutdown_time_left())
+
+    async def post_shutdown(self, app: Application) -> None:
+        # Application.shutdown() has already flushed persistence by now.
+        log_metrics()
+        await dispose_engine()
+
+
+lifecycle = Lifecycle()
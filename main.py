@@ -1,27 +1,43 @@
+from __future__ import annotations
+
 import os
 import logging
+from typing import TYPE_CHECKING
 
 
 from dotenv import load_dotenv
-from sqlalchemy import func, select
-from sqlalchemy.orm import selectinload
-from telegram import (
-    InlineKeyboardButton,
-    InlineKeyboardMarkup,
-    ReplyKeyboardRemove,
-    Update,
+from telegram import Message, Update
+from utils import (
+    INSTRUMENTS_BY_ID,
+    MusicEducation as education,
+    MusicInstrument,
+    NotificationMode,
+    Replies as replies,
+    Templates as templates,
+    instruments_markup,
 )
-from telegram.ext import (
-    ContextTypes,
-    ApplicationBuilder,
-    MessageHandler,
-    ConversationHandler,
-    CommandHandler,
-    CallbackQueryHandler,
-    filters,
+from config import get_settings
+from database import Profile
+from demos import demo_from_message, get_demo_cache, send_card
+from idempotency import claim, drop_duplicate_updates
+from jobs import decks, pop_candidate, register_jobs, track_activity
+from lifecycle import lifecycle
+from notifications import notifications_menu, set_notifications
+from ratelimit import throttle
+from stats import stats
+from storage import get_storage
+from questionnaire import (
+    QuestionnaireError,
+    get_form_template,
+    parse_text,
+    parse_web_app_data,
+    validate,
 )
-from utils import MusicEducation as education, Replies as replies
-from database import Profile, async_session_maker
+
+# telegram.ext pulls in the whole framework (job queue, scheduler, handlers),
+# it's only needed once run_bot() builds the application.
+if TYPE_CHECKING:
+    from telegram.ext import ContextTypes
 
 
 logging.basicConfig(
@@ -48,65 +64,63 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
     FIND,
     LINK,
     LIKE,
-) = range(13)
+    QUICK,
+    INSTRUMENTS,
+    EXPERIENCE,
+) = range(16)
+
+# questionnaire field -> state that collects it step by step
+ANSWERS = {
+    "name": NAME,
+    "faculty": FACULTY,
+    "course": COURSE,
+    "education": EDUCATION,
+    "ex": EX,
+    "music": MUSIC,
+    "favs": FAVS,
+    "opinion": OPINION,
+    "group": GROUP,
+    "find": FIND,
+    "link": LINK,
+}
 
 
 async def get_profile(id: int):
-    async with async_session_maker() as session:
-        return (
-            await session.execute(select(Profile).where(Profile.id == id))
-        ).scalar_one_or_none()
-
-
-async def get_random_profile(exclude_id: int = None):
-    async with async_session_maker() as session:
-        if (
-            await session.execute(select(func.count()).select_from(Profile))
-        ).scalar() <= 1:
-            return None
-        stmt = select(Profile).order_by(func.random()).limit(1)
-        if exclude_id:
-            stmt = stmt.where(Profile.id != exclude_id)
-        result = await session.execute(stmt)
-        return result.scalar_one_or_none()
+    return await get_storage().get_profile(id)
 
 
 async def check_enity_exists(id: int):
-    async with async_session_maker() as session:
-        return await session.get(Profile, id) is not None
+    return await get_profile(id) is not None
 
 
 async def view_profile(update: Update):
     user_profile = await get_profile(update.effective_chat.id)
-    await update.message.reply_text(
-        str(user_profile), reply_markup=replies.MAIN_MARKUP.value
+    await send_card(
+        update.message,
+        update.effective_chat.id,
+        templates.PROFILE.render(profile=user_profile),
     )
     return MAIN
 
 
 async def view_musician(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    async with async_session_maker() as session:
-        user_profile: Profile = await session.get(
-            Profile,
-            update.effective_chat.id,
-            options=[
-                selectinload(Profile.likes),
-            ],
-        )
-        count: Profile = await session.scalar(func.count(Profile.id))
-    musician = await get_random_profile(exclude_id=update.effective_chat.id)
-    if musician is None or len(user_profile.likes) == count - 1:
-        await update.message.reply_text(
-            "Профилей пока нет", reply_markup=replies.MAIN_MARKUP.value
-        )
+    chat_id = update.effective_chat.id
+    wanted = context.user_data.get("wanted_instruments")
+    musician = None
+    # decks are drawn from all profiles, filtered feeds go to storage
+    if not wanted and chat_id in decks:
+        liked_ids = await get_storage().get_liked_ids(chat_id)
+        candidate_id = pop_candidate(chat_id, exclude=liked_ids | {chat_id})
+        if candidate_id is not None:
+            musician = await get_profile(candidate_id)
+    if musician is None:
+        musician = await get_storage().get_candidate(chat_id, wanted)
+    if musician is None:
+        await update.message.reply_text(**templates.NO_PROFILES.render())
         return MAIN
-    if musician in user_profile.likes:
-        return await view_musician(exclude_id=update.effective_chat.id)
 
     context.user_data["profile_id"] = musician.id
-    await update.message.reply_text(
-        str(musician), reply_markup=replies.LIKE_MARKUP.value
-    )
+    await send_card(update.message, musician.id, templates.CARD.render(profile=musician))
 
     return LIKE
 
@@ -118,12 +132,14 @@ async def main(update: Update, context: ContextTypes.DEFAULT_TYPE):
         case replies.PROFILE.value:
             return await view_profile(update=update)
         case replies.EDIT.value:
-            await update.message.reply_text("Введи имя:")
+            await update.message.reply_text(**templates.ENTER_NAME.render())
             return NAME
+        case replies.QUICK.value:
+            return await quick_form(update=update, context=context)
         case replies.VIEW.value:
             return await view_musician(update=update, context=context)
         case replies.INFO.value:
-            await update.message.reply_text(replies.MAN.value, parse_mode="HTML")
+            await update.message.reply_text(**templates.MANUAL.render())
             return MAIN
 
     return await default(update=update, context=context)
@@ -131,24 +147,22 @@ async def main(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if await check_enity_exists(id=update.effective_chat.id):
-        await update.message.reply_text(
-            "Выбери действие:", reply_markup=replies.MAIN_MARKUP.value
-        )
+        await update.message.reply_text(**templates.CHOOSE_ACTION.render())
         return MAIN
 
-    await update.message.reply_text(replies.START.value)
+    await update.message.reply_text(**templates.START.render())
     return NAME
 
 
 async def name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data[NAME] = update.message.text
-    await update.message.reply_text(replies.FACULTY.value)
+    await update.message.reply_text(**templates.FACULTY.render())
     return FACULTY
 
 
 async def faculty(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data[FACULTY] = update.message.text
-    await update.message.reply_text(replies.COURSE.value)
+    await update.message.reply_text(**templates.COURSE.render())
     return COURSE
 
 
@@ -156,16 +170,10 @@ async def course(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         context.user_data[COURSE] = int(update.message.text)
     except ValueError:
-        await update.message.reply_text(replies.COURSE.value)
+        await update.message.reply_text(**templates.COURSE.render())
         return COURSE
 
-    keyboard = [
-        [InlineKeyboardButton(member.value, callback_data=member.name)]
-        for member in education.__members__.values()
-    ]
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(replies.EDUCATION.value, reply_markup=reply_markup)
+    await update.message.reply_text(**templates.EDUCATION.render())
     return EDUCATION
 
 
@@ -173,53 +181,153 @@ async def edu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     context.user_data[EDUCATION] = education[query.data]
-    await query.edit_message_text(replies.EX.value)
-    return EX
+    # instrument id -> years, filled in by experience()
+    context.user_data[INSTRUMENTS] = {}
+    await query.edit_message_text(
+        **templates.INSTRUMENTS.render(),
+        reply_markup=instruments_markup("instrument", frozenset()),
+    )
+    return INSTRUMENTS
+
+
+def _selection(ids) -> frozenset[MusicInstrument]:
+    return frozenset(INSTRUMENTS_BY_ID[id] for id in ids)
+
+
+async def ask_experience(message: Message, context: ContextTypes.DEFAULT_TYPE):
+    pending = [
+        id for id, years in context.user_data[INSTRUMENTS].items() if years is None
+    ]
+    if not pending:
+        await message.reply_text(**templates.EX.render())
+        return EX
+    await message.reply_text(
+        **templates.EXPERIENCE.render(instrument=INSTRUMENTS_BY_ID[pending[0]].title)
+    )
+    return EXPERIENCE
+
+
+async def instruments(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    selected = context.user_data[INSTRUMENTS]
+    choice = query.data.removeprefix("instrument:")
+    if choice == "DONE":
+        await query.edit_message_reply_markup(reply_markup=None)
+        return await ask_experience(query.message, context)
+
+    id = MusicInstrument[choice].id
+    if id in selected:
+        del selected[id]
+    else:
+        selected[id] = None
+    await query.edit_message_reply_markup(
+        reply_markup=instruments_markup("instrument", _selection(selected))
+    )
+    return INSTRUMENTS
+
+
+async def experience(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    pending = next(
+        id for id, years in context.user_data[INSTRUMENTS].items() if years is None
+    )
+    try:
+        years = int(update.message.text)
+    except ValueError:
+        years = -1
+    if not 0 <= years <= 80:
+        await update.message.reply_text(
+            **templates.EXPERIENCE.render(instrument=INSTRUMENTS_BY_ID[pending].title)
+        )
+        return EXPERIENCE
+
+    context.user_data[INSTRUMENTS][pending] = years
+    return await ask_experience(update.message, context)
 
 
 async def ex(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data[EX] = update.message.text
-    await update.message.reply_text(replies.MUSIC.value)
+    await update.message.reply_text(**templates.MUSIC.render())
     return MUSIC
 
 
 async def music(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data[MUSIC] = update.message.text
-    await update.message.reply_text(replies.FAVS.value)
+    await update.message.reply_text(**templates.FAVS.render())
     return FAVS
 
 
 async def favs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data[FAVS] = update.message.text
-    await update.message.reply_text(replies.OPINION.value)
+    await update.message.reply_text(**templates.OPINION.render())
     return OPINION
 
 
 async def opinion(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data[OPINION] = update.message.text
-    await update.message.reply_text(replies.GROUP.value)
+    await update.message.reply_text(**templates.GROUP.render())
     return GROUP
 
 
 async def group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data[GROUP] = update.message.text
-    await update.message.reply_text(replies.FIND.value)
+    await update.message.reply_text(**templates.FIND.render())
     return FIND
 
 
 async def find(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data[FIND] = update.message.text
-    await update.message.reply_text(replies.LINK.value)
+    # either a link or demos sent right into the chat
+    context.user_data.pop(LINK, None)
+    context.user_data["demos"] = []
+    await update.message.reply_text(**templates.LINK.render())
     return LINK
 
 
 async def link(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data[LINK] = update.message.text
+    if update.message.text != replies.DEMOS_DONE.value:
+        context.user_data[LINK] = update.message.text
+    return await save_profile(update=update, context=context)
 
-    async with async_session_maker() as session:
-        profile: Profile | None = await session.get(Profile, update.effective_chat.id)
 
-        desk = f"""
+async def demo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    demos = context.user_data.setdefault("demos", [])
+    demos.append(demo_from_message(update.message))
+    if len(demos) >= get_settings().MAX_DEMOS:
+        return await save_profile(update=update, context=context)
+
+    await update.message.reply_text(**templates.DEMO_ADDED.render(count=len(demos)))
+    return LINK
+
+
+async def quick_form(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(**get_form_template().render())
+    return QUICK
+
+
+async def quick(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.message
+    try:
+        if message.web_app_data is not None:
+            answers = parse_web_app_data(message.web_app_data.data)
+        else:
+            answers = parse_text(message.text)
+        answers = validate(answers)
+    except QuestionnaireError as e:
+        await message.reply_text(str(e))
+        return QUICK
+
+    for field, state in ANSWERS.items():
+        context.user_data[state] = answers[field]
+    return await save_profile(update=update, context=context)
+
+
+async def upsert_profile(**values) -> Profile:
+    return await get_storage().upsert_profile(**values)
+
+
+async def save_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    desk = f"""
 {context.user_data[EX]}
 {context.user_data[MUSIC]}
 {context.user_data[FAVS]}
@@ -227,89 +335,73 @@ async def link(update: Update, context: ContextTypes.DEFAULT_TYPE):
 {context.user_data[GROUP]}
 {context.user_data[FIND]}
 """
-
-        if profile is None:
-            profile = Profile(
-                id=update.effective_chat.id,
-                username=f"@{update.effective_user.username}",
-                name=context.user_data[NAME],
-                faculty=context.user_data[FACULTY],
-                course=context.user_data[COURSE],
-                education=context.user_data[EDUCATION],
-                desc=desk,
-                link=context.user_data[LINK],
-            )
-            session.add(profile)
-        else:
-            profile.name = context.user_data[NAME]
-            profile.faculty = context.user_data[FACULTY]
-            profile.course = context.user_data[COURSE]
-            profile.education = context.user_data[EDUCATION]
-            profile.desc = desk
-            profile.link = context.user_data[LINK]
-
-        await session.commit()
-        await session.refresh(profile)
+    profile = await upsert_profile(
+        id=update.effective_chat.id,
+        username=f"@{update.effective_user.username}",
+        name=context.user_data[NAME],
+        faculty=context.user_data[FACULTY],
+        course=context.user_data[COURSE],
+        education=context.user_data[EDUCATION],
+        desc=desk,
+        link=context.user_data.get(LINK, ""),
+        # the quick form doesn't ask for instruments and demos, they are
+        # kept then
+        experience=context.user_data.get(INSTRUMENTS),
+        demos=context.user_data.pop("demos", None),
+    )
+    await get_demo_cache().invalidate(profile.id)
 
     context.user_data["user_profile"] = profile
-    await update.message.reply_text("Профиль сохранен")
-    await update.message.reply_text(
-        str(profile), reply_markup=replies.MAIN_MARKUP.value
+    await update.message.reply_text(**templates.PROFILE_SAVED.render())
+    await send_card(
+        update.message, profile.id, templates.PROFILE.render(profile=profile)
     )
     return MAIN
 
 
 async def like(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    async with async_session_maker() as session:
-        match update.message.text:
-            case replies.LIKE.value:
-                user_profile: Profile = await session.get(
-                    Profile,
-                    update.effective_chat.id,
-                    options=[
-                        selectinload(Profile.likes),
-                        selectinload(Profile.liked_by),
-                    ],
-                )
-                liked_profile: Profile = await session.get(
-                    Profile,
-                    context.user_data["profile_id"],
-                    options=[
-                        selectinload(Profile.likes),
-                        selectinload(Profile.liked_by),
-                    ],
-                )
-
-                liked_by = f"Твой профиль понравился\n{str(user_profile)}"
-                greeting = "Начинай общаться 👉"
+    match update.message.text:
+        case replies.LIKE.value:
+            # a repeated tap on the same card changes nothing
+            if not await claim(
+                "like", update.effective_chat.id, context.user_data["profile_id"]
+            ):
+                return LIKE
+            result = await get_storage().add_like(
+                update.effective_chat.id, context.user_data["profile_id"]
+            )
 
-                if liked_profile in user_profile.liked_by:
-                    user_profile.likes.append(liked_profile)
-                    await session.commit()
-                    await context.bot.send_message(
-                        chat_id=liked_profile.id,
-                        text=f"{liked_by}\n{greeting}{user_profile.username}",
-                        reply_markup=replies.CONTINUE_MARKUP.value,
-                    )
-                    await update.message.reply_text(
-                        f"{greeting}{liked_profile.username}"
+            if result is not None and result.mutual:
+                lifecycle.track(
+                    context.bot.send_message(
+                        chat_id=result.liked.id,
+                        **templates.MATCHED_BY.render(
+                            profile=result.liker, username=result.liker.username
+                        ),
                     )
-                elif liked_profile not in user_profile.likes:
-                    user_profile.likes.append(liked_profile)
-                    await session.commit()
-                    await context.bot.send_message(
-                        chat_id=liked_profile.id,
-                        text=liked_by,
-                        reply_markup=replies.CONTINUE_WATCHING_MARKUP.value,
+                )
+                await update.message.reply_text(
+                    **templates.MATCH.render(username=result.liked.username)
+                )
+            # the others hear about it in their next digest
+            elif (
+                result is not None
+                and result.liked.notifications is NotificationMode.INSTANT
+            ):
+                lifecycle.track(
+                    context.bot.send_message(
+                        chat_id=result.liked.id,
+                        **templates.LIKED_BY.render(profile=result.liker),
                     )
+                )
 
-                return await view_musician(update=update, context=context)
+            return await view_musician(update=update, context=context)
 
-            case replies.DISLIKE.value:
-                return await view_musician(update=update, context=context)
+        case replies.DISLIKE.value:
+            return await view_musician(update=update, context=context)
 
-            case replies.PROFILE.value:
-                return await view_profile(update=update)
+        case replies.PROFILE.value:
+            return await view_profile(update=update)
 
     return await default(update=update, context=context)
 
@@ -319,58 +411,175 @@ async def default(update: Update, context: ContextTypes.DEFAULT_TYPE):
         case replies.CONTINUE.value:
             return await view_musician(update=update, context=context)
         case replies.CONTINUE_WATCHING.value:
-            async with async_session_maker() as session:
-                user_profile: Profile = await session.get(
-                    Profile,
-                    update.effective_chat.id,
-                    options=[selectinload(Profile.liked_by)],
-                )
-                profile = user_profile.liked_by[0]
-                context.user_data["profile_id"] = profile.id
-                await update.message.reply_text(
-                    str(profile), reply_markup=replies.LIKE_MARKUP.value
-                )
+            profile = await get_storage().get_first_liker(update.effective_chat.id)
+            if profile is None:
+                return await view_musician(update=update, context=context)
+            context.user_data["profile_id"] = profile.id
+            await send_card(
+                update.message, profile.id, templates.CARD.render(profile=profile)
+            )
 
-                return LIKE
+            return LIKE
+
+    # e.g. a ❤️ under a card from before the conversation timed out
+    await update.message.reply_text(**templates.CHOOSE_ACTION.render())
+    return MAIN
 
 
-async def restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data.clear()
+async def resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Menu and notification buttons of a chat whose conversation has ended,
+    by the idle timeout or a restart, bring it back to the main menu."""
+    if not await check_enity_exists(id=update.effective_chat.id):
+        return await start(update=update, context=context)
+    return await main(update=update, context=context)
 
+
+async def filter_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    wanted = context.user_data.get("wanted_instruments", [])
     await update.message.reply_text(
-        "🔄 Сессия сброшена! Начинаем заново.\n" "Отправь /start чтобы начать сначала.",
-        reply_markup=ReplyKeyboardRemove(),
+        **templates.FILTER.render(),
+        reply_markup=instruments_markup("filter", _selection(wanted)),
+    )
+
+
+async def set_filter(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    wanted: list[int] = context.user_data.setdefault("wanted_instruments", [])
+    choice = query.data.removeprefix("filter:")
+    if choice == "DONE":
+        if wanted:
+            await query.edit_message_text(
+                **templates.FILTER_SAVED.render(
+                    instruments=", ".join(
+                        INSTRUMENTS_BY_ID[id].title for id in wanted
+                    )
+                )
+            )
+        else:
+            await query.edit_message_text(**templates.FILTER_RESET.render())
+        return
+
+    id = MusicInstrument[choice].id
+    if id in wanted:
+        wanted.remove(id)
+    else:
+        wanted.append(id)
+    await query.edit_message_reply_markup(
+        reply_markup=instruments_markup("filter", _selection(wanted))
     )
 
+
+async def restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    from telegram.ext import ConversationHandler
+
+    context.user_data.clear()
+
+    await update.message.reply_text(**templates.RESTART.render())
+
     return ConversationHandler.END
 
 
 def run_bot():
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    from telegram.ext import (
+        ApplicationBuilder,
+        MessageHandler,
+        ConversationHandler,
+        CommandHandler,
+        CallbackQueryHandler,
+        TypeHandler,
+        filters,
+    )
+
+    app = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .post_init(lifecycle.post_init)
+        .post_stop(lifecycle.post_stop)
+        .post_shutdown(lifecycle.post_shutdown)
+        .build()
+    )
 
     conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
+        entry_points=[
+            CommandHandler("start", start),
+            CommandHandler("quick", quick_form),
+            MessageHandler(
+                filters.Text(
+                    [
+                        reply.value
+                        for reply in (
+                            replies.PROFILE,
+                            replies.EDIT,
+                            replies.QUICK,
+                            replies.VIEW,
+                            replies.INFO,
+                            replies.CONTINUE,
+                            replies.CONTINUE_WATCHING,
+                        )
+                    ]
+                ),
+                resume,
+            ),
+        ],
         states={
             MAIN: [MessageHandler(filters.TEXT & ~filters.COMMAND, main)],
             NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, name)],
             FACULTY: [MessageHandler(filters.TEXT & ~filters.COMMAND, faculty)],
             COURSE: [MessageHandler(filters.TEXT & ~filters.COMMAND, course)],
-            EDUCATION: [CallbackQueryHandler(edu)],
+            EDUCATION: [
+                CallbackQueryHandler(
+                    edu, pattern=f"^({'|'.join(education.__members__)})$"
+                )
+            ],
+            INSTRUMENTS: [CallbackQueryHandler(instruments, pattern="^instrument:")],
+            EXPERIENCE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, experience)
+            ],
             EX: [MessageHandler(filters.TEXT & ~filters.COMMAND, ex)],
             MUSIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, music)],
             FAVS: [MessageHandler(filters.TEXT & ~filters.COMMAND, favs)],
             OPINION: [MessageHandler(filters.TEXT & ~filters.COMMAND, opinion)],
             GROUP: [MessageHandler(filters.TEXT & ~filters.COMMAND, group)],
             FIND: [MessageHandler(filters.TEXT & ~filters.COMMAND, find)],
-            LINK: [MessageHandler(filters.TEXT & ~filters.COMMAND, link)],
+            LINK: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, link),
+                MessageHandler(filters.VOICE | filters.AUDIO | filters.VIDEO, demo),
+            ],
             LIKE: [MessageHandler(filters.TEXT & ~filters.COMMAND, like)],
+            QUICK: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, quick),
+                MessageHandler(filters.StatusUpdate.WEB_APP_DATA, quick),
+            ],
         },
-        fallbacks=[CommandHandler("start", restart)],
+        fallbacks=[
+            CommandHandler("start", restart),
+            CommandHandler("quick", quick_form),
+        ],
+        # idle chats leave the conversation before prune_conversations drops
+        # their user_data, a late ❤️ must not find the state without it
+        conversation_timeout=get_settings().STALE_CONVERSATION_SECONDS,
     )
 
+    app.add_handler(TypeHandler(Update, drop_duplicate_updates), group=-3)
+    app.add_handler(TypeHandler(Update, throttle), group=-2)
+    app.add_handler(TypeHandler(Update, track_activity), group=-1)
+    app.add_handler(CommandHandler("notifications", notifications_menu))
+    app.add_handler(
+        CommandHandler(
+            "stats",
+            stats,
+            filters=filters.User(user_id=get_settings().ADMIN_IDS),
+        )
+    )
+    app.add_handler(CallbackQueryHandler(set_notifications, pattern="^notify:"))
+    app.add_handler(CommandHandler("filter", filter_menu))
+    app.add_handler(CallbackQueryHandler(set_filter, pattern="^filter:"))
     app.add_handler(conv_handler)
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, default))
 
+    register_jobs(app)
+
     app.run_polling()
 
 
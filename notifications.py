@@ -0,0 +1,218 @@
+"""Like notifications: per-user preference and hourly/daily digests.
+
+Profiles with NotificationMode.INSTANT hear about every like right away.
+Everyone else gets one digest per period, built by a single aggregated query
+over profilelikes and delivered by a throttled batch sender. The digest_sent_at
+watermark of a profile only moves once its digest went out, batch by batch, so
+a run cut short by a restart is picked up by the next one. Mutual likes are
+always sent instantly by like() and are left out of digests.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Iterable
+
+from sqlalchemy import and_, case, exists, func, select, update as update_stmt
+from sqlalchemy.orm import aliased
+
+from config import get_settings
+from database import (
+    Profile,
+    ProfileLike,
+    async_session_maker,
+    get_profile_cache,
+    mark_written,
+)
+from utils import NotificationMode, Templates as templates
+
+if TYPE_CHECKING:
+    from telegram import Bot, Update
+    from telegram.ext import ContextTypes
+
+
+logger = logging.getLogger(__name__)
+
+# digests whose watermark is moved together
+DIGEST_BATCH = 100
+
+DIGEST_PERIODS = {
+    NotificationMode.HOURLY: "за последний час",
+    NotificationMode.DAILY: "за последние сутки",
+}
+
+
+class BatchSender:
+    """Sends messages no faster than `rate` per second, honouring RetryAfter
+    from Telegram and skipping chats that blocked the bot."""
+
+    def __init__(self, bot: Bot, rate: float):
+        self.bot = bot
+        self.interval = 1 / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+        self.sent = 0
+        self.failed = 0
+
+    async def _wait_for_slot(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def send(self, chat_id: int, **kwargs) -> None:
+        from telegram.error import Forbidden, RetryAfter
+
+        while True:
+            await self._wait_for_slot()
+            try:
+                await self.bot.send_message(chat_id=chat_id, **kwargs)
+                self.sent += 1
+                return
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if not isinstance(retry_after, (int, float)):
+                    retry_after = retry_after.total_seconds()
+                logger.warning("flood control, waiting %ss", retry_after)
+                async with self._lock:
+                    self._next_slot = time.monotonic() + retry_after
+            except Forbidden:
+                self.failed += 1
+                return
+
+    async def send_all(
+        self, messages: Iterable[tuple[int, dict]]
+    ) -> list[BaseException | None]:
+        """Sends everything, the result per message is None or the error."""
+        return await asyncio.gather(
+            *(self.send(chat_id, **kwargs) for chat_id, kwargs in messages),
+            return_exceptions=True,
+        )
+
+
+async def collect_digests(
+    mode: NotificationMode, until: datetime
+) -> list[tuple[int, int, list[str]]]:
+    """(profile id, likes count, a few liker names) for every profile with
+    `mode` that got one-sided likes since its last digest, up to `until`."""
+    liker = aliased(Profile)
+    reverse = aliased(ProfileLike)
+    stmt = (
+        select(
+            Profile.id,
+            func.count(),
+            func.array_agg(liker.name)[1:3],
+        )
+        .join(ProfileLike, ProfileLike.liked_id == Profile.id)
+        .join(liker, liker.id == ProfileLike.liker_id)
+        .where(
+            Profile.notifications == mode,
+            ProfileLike.created_at <= until,
+            ProfileLike.created_at
+            > func.coalesce(
+                Profile.digest_sent_at, datetime.min.replace(tzinfo=timezone.utc)
+            ),
+            ~exists().where(
+                and_(
+                    reverse.liker_id == ProfileLike.liked_id,
+                    reverse.liked_id == ProfileLike.liker_id,
+                )
+            ),
+        )
+        .group_by(Profile.id)
+    )
+    # the watermark is read from the primary, a replica may lag behind it
+    async with async_session_maker() as session:
+        rows = (await session.execute(stmt)).all()
+    return [tuple(row) for row in rows]
+
+
+async def mark_digests_sent(ids: list[int], until: datetime) -> None:
+    async with async_session_maker() as session:
+        await session.execute(
+            update_stmt(Profile)
+            .where(Profile.id.in_(ids))
+            .values(digest_sent_at=until)
+        )
+        await session.commit()
+    for id in ids:
+        mark_written(id)
+
+
+async def send_digests(bot: Bot, mode: NotificationMode) -> None:
+    until = datetime.now(timezone.utc)
+    digests = await collect_digests(mode, until)
+
+    sender = BatchSender(bot, get_settings().NOTIFICATION_RATE)
+    errors = 0
+    for start in range(0, len(digests), DIGEST_BATCH):
+        batch = digests[start : start + DIGEST_BATCH]
+        results = await sender.send_all(
+            (
+                id,
+                templates.DIGEST.render(
+                    period=DIGEST_PERIODS[mode],
+                    count=count,
+                    names=", ".join(names),
+                ),
+            )
+            for id, count, names in batch
+        )
+        # chats that blocked the bot are done too, the rest is retried by
+        # the next run
+        done = []
+        for (id, _, _), error in zip(batch, results):
+            if error is None:
+                done.append(id)
+            else:
+                errors += 1
+                logger.error("digest to %s failed", id, exc_info=error)
+        if done:
+            await mark_digests_sent(done, until)
+    logger.info(
+        "%s digests: %s sent, %s blocked, %s failed",
+        mode.name,
+        sender.sent,
+        sender.failed,
+        errors,
+    )
+
+
+async def notifications_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(**templates.NOTIFICATIONS.render())
+
+
+async def set_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    mode = NotificationMode[query.data.removeprefix("notify:")]
+    async with async_session_maker() as session:
+        await session.execute(
+            update_stmt(Profile)
+            .where(Profile.id == update.effective_chat.id)
+            .values(
+                notifications=mode,
+                # Likes from before a switch away from INSTANT were already
+                # pushed, digests start from now. Between digest modes the
+                # watermark stays, so likes still waiting for the old digest
+                # go into the new one.
+                digest_sent_at=case(
+                    (
+                        Profile.notifications == NotificationMode.INSTANT,
+                        func.now(),
+                    ),
+                    else_=Profile.digest_sent_at,
+                ),
+            )
+        )
+        await session.commit()
+    mark_written(update.effective_chat.id)
+    await get_profile_cache().invalidate(update.effective_chat.id)
+    await query.edit_message_text(
+        **templates.NOTIFICATIONS_SAVED.render(mode=mode.value)
+    )
@@ -0,0 +1,359 @@
+"""Helpers for migrations that must not stall the bot.
+
+`alembic upgrade head` runs right before the bot starts, so a migration that
+rewrites a big table under ACCESS EXCLUSIVE keeps the bot down for the whole
+rewrite. These helpers split such changes into short steps:
+
+* every DDL statement runs with a lock timeout and is retried instead of
+  queueing behind (and blocking) live traffic;
+* indexes are built with CREATE INDEX CONCURRENTLY outside a transaction;
+* column type changes go through a shadow column that is kept in sync by a
+  trigger, backfilled in small batches and swapped in at the end.
+
+All functions are meant to be called from a migration's upgrade()/downgrade().
+"""
+
+import logging
+import time
+from typing import Callable, TypeVar
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.exc import DBAPIError
+
+
+logger = logging.getLogger("alembic.online")
+
+LOCK_NOT_AVAILABLE = "55P03"
+
+T = TypeVar("T")
+
+
+def is_lock_timeout(error: DBAPIError) -> bool:
+    orig = error.orig
+    return (
+        getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    ) == LOCK_NOT_AVAILABLE
+
+
+def with_lock_retry(
+    step: Callable[[], T],
+    lock_timeout: str = "2s",
+    attempts: int = 10,
+    backoff: float = 0.5,
+) -> T:
+    """Runs `step` in a savepoint with a local lock timeout, retrying while the
+    lock can't be acquired. Must be called inside the migration transaction."""
+    connection = op.get_bind()
+    for attempt in range(1, attempts + 1):
+        savepoint = connection.begin_nested()
+        try:
+            connection.exec_driver_sql(f"SET LOCAL lock_timeout = '{lock_timeout}'")
+            result = step()
+            savepoint.commit()
+            return result
+        except DBAPIError as error:
+            savepoint.rollback()
+            if not is_lock_timeout(error) or attempt == attempts:
+                raise
+            logger.warning(
+                "lock timeout, retrying (%s/%s) in %.1fs", attempt, attempts, backoff
+            )
+            time.sleep(backoff)
+            backoff *= 2
+
+
+def _autocommit_with_retry(
+    statement: str, lock_timeout: str, attempts: int, backoff: float
+) -> None:
+    connection = op.get_bind()
+    connection.exec_driver_sql(f"SET lock_timeout = '{lock_timeout}'")
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                connection.exec_driver_sql(statement)
+                return
+            except DBAPIError as error:
+                if not is_lock_timeout(error) or attempt == attempts:
+                    raise
+                logger.warning(
+                    "lock timeout, retrying (%s/%s) in %.1fs",
+                    attempt,
+                    attempts,
+                    backoff,
+                )
+                time.sleep(backoff)
+                backoff *= 2
+    finally:
+        connection.exec_driver_sql("RESET lock_timeout")
+
+
+def create_index_concurrently(
+    name: str,
+    table: str,
+    columns: list[str],
+    unique: bool = False,
+    using: str | None = None,
+    lock_timeout: str = "2s",
+    attempts: int = 10,
+    backoff: float = 0.5,
+) -> None:
+    """CREATE INDEX CONCURRENTLY outside the migration transaction.
+
+    A failed concurrent build leaves an INVALID index behind, so it's dropped
+    before every attempt."""
+    columns_sql = ", ".join(f'"{column}"' for column in columns)
+    using_sql = f" USING {using}" if using else ""
+    with op.get_context().autocommit_block():
+        for attempt in range(1, attempts + 1):
+            invalid = op.get_bind().scalar(
+                sa.text(
+                    "SELECT NOT indisvalid FROM pg_index "
+                    "WHERE indexrelid = to_regclass(:name)"
+                ),
+                {"name": name},
+            )
+            if invalid:
+                _autocommit_with_retry(
+                    f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"',
+                    lock_timeout,
+                    attempts,
+                    backoff,
+                )
+            try:
+                _autocommit_with_retry(
+                    f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY "
+                    f'IF NOT EXISTS "{name}" ON "{table}"{using_sql} ({columns_sql})',
+                    lock_timeout,
+                    1,
+                    backoff,
+                )
+                return
+            except DBAPIError as error:
+                if not is_lock_timeout(error) or attempt == attempts:
+                    raise
+                time.sleep(backoff)
+                backoff *= 2
+
+
+def drop_index_concurrently(
+    name: str, lock_timeout: str = "2s", attempts: int = 10, backoff: float = 0.5
+) -> None:
+    with op.get_context().autocommit_block():
+        _autocommit_with_retry(
+            f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"',
+            lock_timeout,
+            attempts,
+            backoff,
+        )
+
+
+def backfill_in_batches(
+    table: str,
+    target: str,
+    expression: str,
+    key: str | list[str] = "id",
+    batch_size: int = 5000,
+    pause: float = 0.05,
+) -> int:
+    """Sets `target` to `expression` for every row, walking the table in
+    order of `key` (a unique column or the columns of the primary key), one
+    short autocommitted transaction per batch. NULLs are copied as NULLs.
+    Rows written meanwhile are kept in sync by the shadow column's trigger.
+    Returns the number of rows.
+
+    Qualify the columns in `expression` with the table name."""
+    keys = [key] if isinstance(key, str) else key
+    columns = ", ".join(f'"{name}"' for name in keys)
+    # the CTE's columns are renamed, so the batch key can be the very column
+    # being converted without becoming ambiguous in `expression`
+    batch_columns = ", ".join(f"key{n}" for n in range(len(keys)))
+    params = ", ".join(f":after{n}" for n in range(len(keys)))
+
+    def statement(after: bool) -> sa.TextClause:
+        return sa.text(
+            f"WITH batch ({batch_columns}) AS ("
+            f'SELECT {columns} FROM "{table}" '
+            + (f"WHERE ({columns}) > ({params}) " if after else "")
+            + f"ORDER BY {columns} LIMIT :batch_size) "
+            f'UPDATE "{table}" SET "{target}" = {expression} FROM batch '
+            f"WHERE "
+            + " AND ".join(
+                f'"{table}"."{name}" = batch.key{n}' for n, name in enumerate(keys)
+            )
+            + " RETURNING "
+            + ", ".join(f'"{table}"."{name}"' for name in keys)
+        )
+
+    total = 0
+    after = None
+    with op.get_context().autocommit_block():
+        while True:
+            rows = (
+                op.get_bind()
+                .execute(
+                    statement(after is not None),
+                    {
+                        "batch_size": batch_size,
+                        **{f"after{n}": value for n, value in enumerate(after or ())},
+                    },
+                )
+                .all()
+            )
+            if not rows:
+                break
+            after = max(tuple(row) for row in rows)
+            total += len(rows)
+            logger.info("backfilled %s rows of %s.%s", total, table, target)
+            time.sleep(pause)
+    return total
+
+
+def _shadow(column: str) -> str:
+    return f"{column}__new"
+
+
+def _sync_trigger(table: str, column: str) -> str:
+    return f"{table}_{column}_sync"
+
+
+def add_shadow_column(table: str, column: str, type_: sa.types.TypeEngine) -> None:
+    """Adds a nullable shadow column and a trigger that copies every write of
+    `column` into it. Both are metadata-only changes and take a short lock."""
+    shadow = _shadow(column)
+    trigger = _sync_trigger(table, column)
+    type_sql = type_.compile(dialect=op.get_bind().dialect)
+
+    with_lock_retry(
+        lambda: op.add_column(table, sa.Column(shadow, type_, nullable=True))
+    )
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION "{trigger}"() RETURNS trigger AS $$
+        BEGIN
+            NEW."{shadow}" := NEW."{column}"::{type_sql};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    with_lock_retry(
+        lambda: op.execute(
+            f'CREATE TRIGGER "{trigger}" BEFORE INSERT OR UPDATE ON "{table}" '
+            f'FOR EACH ROW EXECUTE FUNCTION "{trigger}"()'
+        )
+    )
+
+
+def swap_shadow_column(
+    table: str, column: str, primary_key: list[str] | None = None
+) -> None:
+    """Replaces `column` by its backfilled shadow column.
+
+    If the column is part of the primary key, pass the full key: a unique
+    index on the new columns is built concurrently first and then promoted,
+    so the swap itself is a metadata change. Foreign keys referencing the
+    old column are dropped with it, recreate them with
+    add_foreign_key_not_valid() and validate_constraint(). The new column is
+    NOT NULL only if the old one was."""
+    shadow = _shadow(column)
+    trigger = _sync_trigger(table, column)
+    index = None
+    if primary_key:
+        index = f"{table}_pkey__new"
+        create_index_concurrently(
+            index,
+            table,
+            [_shadow(name) if name == column else name for name in primary_key],
+            unique=True,
+        )
+
+    not_null = None
+    if op.get_bind().scalar(
+        sa.text(
+            "SELECT attnotnull FROM pg_attribute "
+            "WHERE attrelid = CAST(:table AS regclass) AND attname = :column"
+        ),
+        {"table": f'"{table}"', "column": column},
+    ):
+        # SET NOT NULL skips the full-table scan when a validated CHECK
+        # proves it.
+        not_null = f"{table}_{shadow}_not_null"
+        with_lock_retry(
+            lambda: op.execute(
+                f'ALTER TABLE "{table}" ADD CONSTRAINT "{not_null}" '
+                f'CHECK ("{shadow}" IS NOT NULL) NOT VALID'
+            )
+        )
+        validate_constraint(table, not_null)
+
+    def swap() -> None:
+        op.execute(f'DROP TRIGGER "{trigger}" ON "{table}"')
+        if not_null:
+            op.execute(
+                f'ALTER TABLE "{table}" ALTER COLUMN "{shadow}" SET NOT NULL'
+            )
+            op.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT "{not_null}"')
+        op.execute(f'ALTER TABLE "{table}" DROP COLUMN "{column}" CASCADE')
+        op.execute(f'ALTER TABLE "{table}" RENAME COLUMN "{shadow}" TO "{column}"')
+        if index:
+            op.execute(f'ALTER INDEX "{index}" RENAME TO "{table}_pkey"')
+            op.execute(
+                f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" '
+                f'PRIMARY KEY USING INDEX "{table}_pkey"'
+            )
+
+    with_lock_retry(swap)
+    op.execute(f'DROP FUNCTION "{trigger}"()')
+
+
+def change_column_type_online(
+    table: str,
+    column: str,
+    type_: sa.types.TypeEngine,
+    primary_key: list[str] | None = None,
+    batch_size: int = 5000,
+) -> None:
+    """Online replacement for op.alter_column(table, column, type_=type_)."""
+    add_shadow_column(table, column, type_)
+    # Leaving the migration transaction commits the trigger, so concurrent
+    # writers keep the shadow column in sync while it is being backfilled.
+    with op.get_context().autocommit_block():
+        pass
+    backfill_in_batches(
+        table,
+        _shadow(column),
+        f'"{table}"."{column}"::{type_.compile(dialect=op.get_bind().dialect)}',
+        key=primary_key or "id",
+        batch_size=batch_size,
+    )
+    swap_shadow_column(table, column, primary_key=primary_key)
+
+
+def add_foreign_key_not_valid(
+    name: str,
+    source: str,
+    referent: str,
+    local_cols: list[str],
+    remote_cols: list[str],
+    ondelete: str | None = None,
+) -> None:
+    """Adds a foreign key without scanning the table; follow it with
+    validate_constraint(), which only takes a SHARE UPDATE EXCLUSIVE lock."""
+    with_lock_retry(
+        lambda: op.create_foreign_key(
+            name,
+            source,
+            referent,
+            local_cols,
+            remote_cols,
+            ondelete=ondelete,
+            postgresql_not_valid=True,
+        )
+    )
+
+
+def validate_constraint(table: str, name: str) -> None:
+    with_lock_retry(
+        lambda: op.execute(f'ALTER TABLE "{table}" VALIDATE CONSTRAINT "{name}"')
+    )
@@ -0,0 +1,130 @@
+"""Whole questionnaire in one message.
+
+A user can send every answer at once, either as a text form
+
+    Имя: Вася
+    Факультет: ВМК
+    ...
+
+or as JSON from a Telegram Web App form. Both are validated here and turned
+into the same answers the step-by-step flow collects.
+"""
+
+import json
+from functools import lru_cache
+
+from telegram import KeyboardButton, WebAppInfo
+
+from config import get_settings
+from utils import CachedReplyKeyboardMarkup, MusicEducation, Template
+
+
+# field -> label in the text form, in questionnaire order
+FIELDS = {
+    "name": "Имя",
+    "faculty": "Факультет",
+    "course": "Курс",
+    "education": "Образование",
+    "ex": "Опыт",
+    "music": "Музыка",
+    "favs": "Вкусы",
+    "opinion": "Каверы",
+    "group": "Группа",
+    "find": "Ищу",
+    "link": "Ссылка",
+}
+LABELS = {label.lower(): field for field, label in FIELDS.items()}
+
+FORM = "\n".join(f"{label}: " for label in FIELDS.values())
+
+
+class QuestionnaireError(ValueError):
+    pass
+
+
+def parse_text(text: str) -> dict[str, str]:
+    """Splits a `Label: value` form. Lines without a known label continue the
+    previous answer, so multi-line answers (like favs) survive."""
+    answers = {}
+    field = None
+    for line in text.splitlines():
+        label, sep, value = line.partition(":")
+        if sep and label.strip().lower() in LABELS:
+            field = LABELS[label.strip().lower()]
+            answers[field] = value.strip()
+        elif field is not None:
+            answers[field] = f"{answers[field]}\n{line}".strip()
+    return answers
+
+
+def parse_web_app_data(data: str) -> dict[str, str]:
+    try:
+        answers = json.loads(data)
+    except json.JSONDecodeError as e:
+        raise QuestionnaireError("Форма пришла в неверном формате") from e
+    if not isinstance(answers, dict):
+        raise QuestionnaireError("Форма пришла в неверном формате")
+    return {field: str(answers[field]).strip() for field in FIELDS if field in answers}
+
+
+def _parse_education(value: str) -> MusicEducation:
+    for member in MusicEducation:
+        if value.lower() in (member.name.lower(), member.value.lower()):
+            return member
+    raise QuestionnaireError(
+        f"{FIELDS['education']}: одно из "
+        + ", ".join(member.value for member in MusicEducation)
+    )
+
+
+def validate(answers: dict[str, str]) -> dict:
+    errors = [
+        f"{label}: не заполнено"
+        for field, label in FIELDS.items()
+        if not answers.get(field)
+    ]
+    if errors:
+        raise QuestionnaireError("\n".join(errors))
+
+    cleaned = dict(answers)
+    try:
+        cleaned["course"] = int(answers["course"])
+    except ValueError:
+        errors.append(f"{FIELDS['course']}: нужно число")
+    try:
+        cleaned["education"] = _parse_education(answers["education"])
+    except QuestionnaireError as e:
+        errors.append(str(e))
+    for field in ("name", "faculty"):
+        if len(answers[field]) > 100:
+            errors.append(f"{FIELDS[field]}: не длиннее 100 символов")
+    if len(answers["link"]) > 200:
+        errors.append(f"{FIELDS['link']}: не длиннее 200 символов")
+    if errors:
+        raise QuestionnaireError("\n".join(errors))
+    return cleaned
+
+
+@lru_cache
+def get_form_template() -> Template:
+    text = (
+        "Скопируй анкету, заполни и пришли одним сообщением.\n"
+        f"{FIELDS['education']} - одно из: "
+        + ", ".join(member.value for member in MusicEducation)
+        + f"\n\n<code>{FORM}</code>"
+    )
+    markup = None
+    if get_settings().WEBAPP_URL is not None:
+        markup = CachedReplyKeyboardMarkup(
+            [
+                [
+                    KeyboardButton(
+                        "Заполнить форму 📝",
+                        web_app=WebAppInfo(url=get_settings().WEBAPP_URL),
+                    )
+                ]
+            ],
+            resize_keyboard=True,
+            one_time_keyboard=True,
+        )
+    return Template(text, reply_markup=markup, parse_mode="HTML")
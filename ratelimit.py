@@ -0,0 +1,127 @@
+"""Token-bucket throttling in front of the conversation handler.
+
+Every chat has a bucket of RATE_LIMIT_BURST tokens refilled at
+RATE_LIMIT_PER_SECOND, and all chats share one global bucket. An update that
+finds either bucket empty is dropped before any handler runs; the chat is
+told once per throttling episode. Chat buckets live in a bounded LRU, so the
+state never outgrows RATE_LIMIT_CHATS entries and every check is O(1).
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from config import get_settings
+from utils import Templates as templates
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated_at", "throttled")
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        # whether the chat was already told it's being throttled
+        self.throttled = False
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+@dataclass
+class RateLimitMetrics:
+    allowed: int = 0
+    throttled_chat: int = 0
+    throttled_global: int = 0
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        burst: float,
+        rate: float,
+        global_burst: float,
+        global_rate: float,
+        maxsize: int,
+    ):
+        self.burst = burst
+        self.rate = rate
+        self.maxsize = maxsize
+        self.global_bucket = TokenBucket(global_burst, global_rate)
+        self._buckets: OrderedDict[int, TokenBucket] = OrderedDict()
+        self.metrics = RateLimitMetrics()
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.burst, self.rate)
+            if len(self._buckets) > self.maxsize:
+                # the least recently active chat has long refilled anyway
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(chat_id)
+        return bucket
+
+    def check(self, chat_id: int) -> tuple[bool, TokenBucket]:
+        now = time.monotonic()
+        bucket = self._bucket(chat_id)
+        if not bucket.take(now):
+            self.metrics.throttled_chat += 1
+            return False, bucket
+        if not self.global_bucket.take(now):
+            # the chat's token is not given back, it still made a request
+            self.metrics.throttled_global += 1
+            return False, bucket
+        bucket.throttled = False
+        self.metrics.allowed += 1
+        return True, bucket
+
+
+@lru_cache
+def get_rate_limiter() -> RateLimiter:
+    settings = get_settings()
+    return RateLimiter(
+        burst=settings.RATE_LIMIT_BURST,
+        rate=settings.RATE_LIMIT_PER_SECOND,
+        global_burst=settings.GLOBAL_RATE_LIMIT_BURST,
+        global_rate=settings.GLOBAL_RATE_LIMIT_PER_SECOND,
+        maxsize=settings.RATE_LIMIT_CHATS,
+    )
+
+
+async def throttle(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    from telegram.ext import ApplicationHandlerStop
+
+    if update.effective_chat is None:
+        return
+    allowed, bucket = get_rate_limiter().check(update.effective_chat.id)
+    if allowed:
+        return
+
+    if not bucket.throttled:
+        bucket.throttled = True
+        logger.warning("throttling chat %s", update.effective_chat.id)
+        if update.effective_message is not None:
+            await update.effective_message.reply_text(**templates.THROTTLED.render())
+    raise ApplicationHandlerStop
@@ -0,0 +1,127 @@
+"""Audience analytics for admins: /stats.
+
+Aggregates live in the profilestats materialized view (see its migration),
+one row per faculty and education. The refresh_stats job refreshes the view
+concurrently, so readers are never blocked, and keeps the rows in memory;
+/stats only formats that snapshot and answers without touching the database.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from sqlalchemy import text
+
+from database import get_engine, read_session
+from utils import MusicEducation, Templates as templates
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
+
+
+@dataclass(slots=True)
+class StatsRow:
+    faculty: str
+    education: MusicEducation
+    profiles: int
+    likers: int
+    likes: int
+    # likes that were returned, each match is counted on both sides
+    matches: int
+
+
+@dataclass
+class StatsSnapshot:
+    rows: list[StatsRow] = field(default_factory=list)
+    refreshed_at: float | None = None
+
+
+snapshot = StatsSnapshot()
+
+# faculties are free text, the long tail is summed up in one line so the
+# message stays under Telegram's 4096 characters
+BREAKDOWN_LIMIT = 20
+
+
+async def refresh_snapshot(refresh_view: bool = True) -> None:
+    if refresh_view:
+        async with get_engine().begin() as connection:
+            await connection.execute(
+                text("REFRESH MATERIALIZED VIEW CONCURRENTLY profilestats")
+            )
+    async with read_session() as session:
+        result = await session.execute(
+            text(
+                "SELECT faculty, education, profiles, likers, likes, matches "
+                "FROM profilestats"
+            )
+        )
+        rows = [
+            StatsRow(
+                faculty=faculty,
+                education=MusicEducation[education],
+                profiles=profiles,
+                likers=likers,
+                likes=likes,
+                matches=matches,
+            )
+            for faculty, education, profiles, likers, likes, matches in result
+        ]
+    snapshot.rows = rows
+    snapshot.refreshed_at = time.time()
+
+
+def _percent(part: int, whole: int) -> str:
+    return f"{part / whole:.0%}" if whole else "—"
+
+
+def _breakdown(rows: list[StatsRow], key) -> str:
+    groups: dict[str, list[int]] = {}
+    for row in rows:
+        totals = groups.setdefault(key(row), [0, 0, 0])
+        totals[0] += row.profiles
+        totals[1] += row.likers
+        totals[2] += row.matches
+    ranked = sorted(groups.items(), key=lambda item: -item[1][0])
+    # A pair can span two groups, so each group reports its own side of the
+    # matches instead of halving them into pairs.
+    lines = [
+        f"{name}: {profiles}, лайкают {_percent(likers, profiles)}, "
+        f"взаимных лайков {matches}"
+        for name, (profiles, likers, matches) in ranked[:BREAKDOWN_LIMIT]
+    ]
+    if rest := ranked[BREAKDOWN_LIMIT:]:
+        lines.append(
+            f"другие ({len(rest)}): "
+            f"{sum(profiles for _, (profiles, _, _) in rest)}"
+        )
+    return "\n".join(lines)
+
+
+def format_snapshot(current: StatsSnapshot) -> dict:
+    rows = current.rows
+    profiles = sum(row.profiles for row in rows)
+    likers = sum(row.likers for row in rows)
+    likes = sum(row.likes for row in rows)
+    matches = sum(row.matches for row in rows)
+    return templates.STATS.render(
+        profiles=profiles,
+        likers=likers,
+        like_rate=_percent(likers, profiles),
+        likes=likes,
+        matches=matches // 2,
+        match_rate=_percent(matches, likes),
+        faculties=_breakdown(rows, lambda row: row.faculty),
+        educations=_breakdown(rows, lambda row: row.education.value),
+        age=int(time.time() - current.refreshed_at),
+    )
+
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if snapshot.refreshed_at is None:
+        # the job hasn't run yet, the view itself is small and quick to read
+        await refresh_snapshot(refresh_view=False)
+    await update.message.reply_text(**format_snapshot(snapshot))
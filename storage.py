@@ -0,0 +1,380 @@
+"""Storage behind the conversation handlers.
+
+    storage = get_storage()
+    profile = await storage.get_profile(chat_id)
+    result = await storage.add_like(chat_id, profile_id)
+    bassist = await storage.get_candidate(chat_id, [MusicInstrument.BASS.id])
+
+PostgresStorage runs the queries against the primary and the replicas and
+keeps the profile cache in sync. MemoryStorage keeps everything in dicts; it
+needs no database at all, so handlers can be exercised and benchmarked
+without Postgres (STORAGE_BACKEND=memory). Background jobs, digests and /stats
+still talk to Postgres directly.
+"""
+
+import random
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+
+from sqlalchemy import Insert, Select, delete, exists, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+
+from config import get_settings
+from database import (
+    Demo,
+    InstrumentItem,
+    Profile,
+    ProfileLike,
+    async_session_maker,
+    get_profile_cache,
+    mark_written,
+    read_session,
+)
+from utils import NotificationMode
+
+
+@dataclass(slots=True)
+class LikeResult:
+    liker: Profile
+    liked: Profile
+    mutual: bool
+
+
+def _literal_rows(model: type, rows: list[dict]) -> list[dict]:
+    """Multi-row VALUES with anonymous parameters; two of them in one
+    statement would share parameter names otherwise."""
+    columns = model.__table__.c
+    return [
+        {key: literal(value, columns[key].type) for key, value in row.items()}
+        for row in rows
+    ]
+
+
+class Storage(ABC):
+    @abstractmethod
+    async def get_profile(self, id: int) -> Profile | None: ...
+
+    @abstractmethod
+    async def get_liked_ids(self, chat_id: int) -> set[int]:
+        """Ids of the profiles the chat liked."""
+
+    @abstractmethod
+    async def get_candidate(
+        self, chat_id: int, instrument_ids: list[int] | None = None
+    ) -> Profile | None:
+        """A random profile other than the chat's own that the chat hasn't
+        liked yet and, if `instrument_ids` are given, that plays any of
+        them."""
+
+    @abstractmethod
+    async def get_demos(self, profile_id: int) -> list[Demo]:
+        """In the order they were sent."""
+
+    @abstractmethod
+    async def upsert_profile(
+        self,
+        experience: dict[int, int] | None = None,
+        demos: list[dict] | None = None,
+        **values,
+    ) -> Profile:
+        """Inserts or updates the profile. The username is only set on
+        insert, like the questionnaire always did. `experience` (instrument
+        id -> years) replaces the profile's instruments and `demos` (Demo
+        columns) its demos, None keeps them."""
+
+    @abstractmethod
+    async def add_like(self, liker_id: int, liked_id: int) -> LikeResult | None:
+        """None if the like already exists."""
+
+    @abstractmethod
+    async def get_first_liker(self, id: int) -> Profile | None: ...
+
+
+class PostgresStorage(Storage):
+    # The statements are built by these methods so that
+    # benchmarks.query_plans checks the very SQL the bot sends.
+
+    @staticmethod
+    def liked_ids_query(chat_id: int) -> Select:
+        # only the ids of liked profiles are needed, not the viewer's row
+        return select(ProfileLike.liked_id).where(ProfileLike.liker_id == chat_id)
+
+    @staticmethod
+    def candidate_query(
+        chat_id: int, instrument_ids: list[int] | None = None
+    ) -> Select:
+        # liked profiles are skipped by the query itself, so a single pick is
+        # always a fresh one
+        stmt = (
+            select(Profile)
+            .where(
+                Profile.id != chat_id,
+                ~exists().where(
+                    ProfileLike.liker_id == chat_id, ProfileLike.liked_id == Profile.id
+                ),
+            )
+            .order_by(func.random())
+            .limit(1)
+        )
+        if instrument_ids:
+            # the overlap is answered by the GIN index on instrument_ids
+            stmt = stmt.where(Profile.instrument_ids.overlap(instrument_ids))
+        return stmt
+
+    @staticmethod
+    def demos_query(profile_id: int) -> Select:
+        return select(Demo).where(Demo.profile_id == profile_id).order_by(Demo.id)
+
+    @staticmethod
+    def like_statement(liker_id: int, liked_id: int) -> Insert:
+        """Records the like and returns whether the reverse one exists, or no
+        row if the like already existed."""
+        reverse = aliased(ProfileLike)
+        return (
+            insert(ProfileLike)
+            .values(liker_id=liker_id, liked_id=liked_id)
+            .on_conflict_do_nothing()
+            .returning(
+                exists().where(
+                    reverse.liker_id == liked_id, reverse.liked_id == liker_id
+                )
+            )
+        )
+
+    @staticmethod
+    def upsert_statement(
+        experience: dict[int, int] | None = None,
+        demos: list[dict] | None = None,
+        **values,
+    ) -> Insert:
+        """One INSERT ... ON CONFLICT DO UPDATE for the profile. The
+        instruments and demos are replaced by data-modifying CTEs of the same
+        statement, so saving costs a single round trip either way."""
+        id = values["id"]
+        if experience is not None:
+            values["instrument_ids"] = sorted(experience)
+        updated = [key for key in values if key not in ("id", "username")]
+        # SQLAlchemy leaves Python-side column defaults unset in an INSERT
+        # that carries data-modifying CTEs, they only apply to new rows here.
+        for column in Profile.__table__.c:
+            if column.key not in values and column.default is not None:
+                default = column.default
+                values[column.key] = (
+                    default.arg(None) if default.is_callable else default.arg
+                )
+        stmt = insert(Profile).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Profile.id],
+            set_={key: stmt.excluded[key] for key in updated},
+        ).returning(Profile)
+
+        # The CTEs work on one snapshot, so the deletes never touch rows
+        # inserted next to them. The foreign keys are checked at the end of
+        # the statement, after the profile itself is in.
+        if experience is not None:
+            stmt = stmt.add_cte(
+                delete(InstrumentItem)
+                .where(
+                    InstrumentItem.profile_id == id,
+                    InstrumentItem.instrument_id.not_in(list(experience)),
+                )
+                .cte("stale_instruments")
+            )
+            if experience:
+                items = insert(InstrumentItem).values(
+                    _literal_rows(
+                        InstrumentItem,
+                        [
+                            dict(
+                                profile_id=id,
+                                instrument_id=instrument_id,
+                                experience=years,
+                            )
+                            for instrument_id, years in experience.items()
+                        ],
+                    )
+                )
+                items = items.on_conflict_do_update(
+                    index_elements=[
+                        InstrumentItem.profile_id,
+                        InstrumentItem.instrument_id,
+                    ],
+                    set_={"experience": items.excluded.experience},
+                )
+                stmt = stmt.add_cte(items.cte("instruments"))
+        if demos is not None:
+            stmt = stmt.add_cte(
+                delete(Demo).where(Demo.profile_id == id).cte("stale_demos")
+            )
+            if demos:
+                stmt = stmt.add_cte(
+                    insert(Demo)
+                    .values(
+                        _literal_rows(
+                            Demo, [dict(demo, profile_id=id) for demo in demos]
+                        )
+                    )
+                    .cte("demos")
+                )
+        return stmt
+
+    @staticmethod
+    def first_liker_query(id: int) -> Select:
+        return (
+            select(Profile)
+            .join(ProfileLike, ProfileLike.liker_id == Profile.id)
+            .where(ProfileLike.liked_id == id)
+            .order_by(ProfileLike.created_at)
+            .limit(1)
+        )
+
+    async def get_profile(self, id: int) -> Profile | None:
+        return await get_profile_cache().get(id)
+
+    async def get_liked_ids(self, chat_id: int) -> set[int]:
+        async with read_session(chat_id) as session:
+            return set(await session.scalars(self.liked_ids_query(chat_id)))
+
+    async def get_candidate(
+        self, chat_id: int, instrument_ids: list[int] | None = None
+    ) -> Profile | None:
+        async with read_session(chat_id) as session:
+            return await session.scalar(
+                self.candidate_query(chat_id, instrument_ids)
+            )
+
+    async def get_demos(self, profile_id: int) -> list[Demo]:
+        async with read_session(profile_id) as session:
+            return list(await session.scalars(self.demos_query(profile_id)))
+
+    async def upsert_profile(
+        self,
+        experience: dict[int, int] | None = None,
+        demos: list[dict] | None = None,
+        **values,
+    ) -> Profile:
+        async with async_session_maker() as session:
+            # A single statement is atomic on its own, autocommit saves the
+            # BEGIN/COMMIT round trips around it.
+            await session.connection(
+                execution_options={"isolation_level": "AUTOCOMMIT"}
+            )
+            profile = await session.scalar(
+                self.upsert_statement(experience, demos, **values),
+                execution_options={"populate_existing": True},
+            )
+        mark_written(profile.id)
+        await get_profile_cache().set(profile.id, profile)
+        return profile
+
+    async def add_like(self, liker_id: int, liked_id: int) -> LikeResult | None:
+        # The like and the check for the reverse one are a single statement
+        # on primary keys, the profiles' collections are never loaded.
+        async with async_session_maker() as session:
+            await session.connection(
+                execution_options={"isolation_level": "AUTOCOMMIT"}
+            )
+            mutual = await session.scalar(self.like_statement(liker_id, liked_id))
+        if mutual is None:
+            return None
+        mark_written(liker_id)
+        mark_written(liked_id)
+        return LikeResult(
+            liker=await self.get_profile(liker_id),
+            liked=await self.get_profile(liked_id),
+            mutual=mutual,
+        )
+
+    async def get_first_liker(self, id: int) -> Profile | None:
+        async with read_session(id) as session:
+            return await session.scalar(self.first_liker_query(id))
+
+
+class MemoryStorage(Storage):
+    def __init__(self):
+        self.profiles: dict[int, Profile] = {}
+        # ids in insertion order, random.choice over a list is O(1)
+        self._ids: list[int] = []
+        # profile id -> instrument id -> years
+        self.instruments: dict[int, dict[int, int]] = {}
+        self.demos: dict[int, list[Demo]] = {}
+        self.likes: dict[int, set[int]] = {}
+        # liked id -> liker ids, in the order the likes came
+        self.liked_by: dict[int, dict[int, None]] = {}
+
+    async def get_profile(self, id: int) -> Profile | None:
+        return self.profiles.get(id)
+
+    async def get_liked_ids(self, chat_id: int) -> set[int]:
+        return set(self.likes.get(chat_id, ()))
+
+    async def get_candidate(
+        self, chat_id: int, instrument_ids: list[int] | None = None
+    ) -> Profile | None:
+        wanted = set(instrument_ids or ())
+        liked = self.likes.get(chat_id, ())
+        candidates = [
+            id
+            for id in self._ids
+            if id != chat_id
+            and id not in liked
+            and (not wanted or not wanted.isdisjoint(self.instruments.get(id, ())))
+        ]
+        return self.profiles[random.choice(candidates)] if candidates else None
+
+    async def upsert_profile(
+        self,
+        experience: dict[int, int] | None = None,
+        demos: list[dict] | None = None,
+        **values,
+    ) -> Profile:
+        if experience is not None:
+            values["instrument_ids"] = sorted(experience)
+            self.instruments[values["id"]] = dict(experience)
+        if demos is not None:
+            self.demos[values["id"]] = [
+                Demo(profile_id=values["id"], **demo) for demo in demos
+            ]
+        profile = self.profiles.get(values["id"])
+        if profile is None:
+            values.setdefault("notifications", NotificationMode.INSTANT)
+            profile = self.profiles[values["id"]] = Profile(**values)
+            self._ids.append(profile.id)
+        else:
+            for key, value in values.items():
+                if key not in ("id", "username"):
+                    setattr(profile, key, value)
+        return profile
+
+    async def add_like(self, liker_id: int, liked_id: int) -> LikeResult | None:
+        likes = self.likes.setdefault(liker_id, set())
+        if liked_id in likes:
+            return None
+        likes.add(liked_id)
+        self.liked_by.setdefault(liked_id, {})[liker_id] = None
+        return LikeResult(
+            liker=self.profiles[liker_id],
+            liked=self.profiles[liked_id],
+            mutual=liker_id in self.likes.get(liked_id, ()),
+        )
+
+    async def get_demos(self, profile_id: int) -> list[Demo]:
+        return self.demos.get(profile_id, [])
+
+    async def get_first_liker(self, id: int) -> Profile | None:
+        for liker_id in self.liked_by.get(id, ()):
+            return self.profiles[liker_id]
+        return None
+
+
+STORAGE_BACKENDS: dict[str, type[Storage]] = {
+    "postgres": PostgresStorage,
+    "memory": MemoryStorage,
+}
+
+
+@lru_cache
+def get_storage() -> Storage:
+    return STORAGE_BACKENDS[get_settings().STORAGE_BACKEND]()
@@ -1,6 +1,14 @@
+import json
 from enum import Enum
+from functools import lru_cache
 
-from telegram import InlineKeyboardButton, ReplyKeyboardMarkup
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    ReplyKeyboardMarkup,
+    ReplyKeyboardRemove,
+    TelegramObject,
+)
 
 
 class MusicEducation(Enum):
@@ -10,9 +18,84 @@ class MusicEducation(Enum):
     SELF = "Самоучка"
 
 
+class MusicInstrument(Enum):
+    """Rows of the instruments table: (id, title). The ids are seeded by the
+    migration that creates the table."""
+
+    VOCALS = 1, "Вокал"
+    GUITAR = 2, "Гитара"
+    BASS = 3, "Бас-гитара"
+    DRUMS = 4, "Барабаны"
+    KEYS = 5, "Клавишные"
+    STRINGS = 6, "Струнные"
+    WINDS = 7, "Духовые"
+
+    def __init__(self, id: int, title: str):
+        self.id = id
+        self.title = title
+
+
+INSTRUMENTS_BY_ID = {member.id: member for member in MusicInstrument}
+
+
+class DemoKind(Enum):
+    VOICE = "Голосовое"
+    AUDIO = "Аудио"
+    VIDEO = "Видео"
+
+
+class NotificationMode(Enum):
+    INSTANT = "Сразу"
+    HOURLY = "Раз в час"
+    DAILY = "Раз в день"
+
+
+class _CachedPayload:
+    """Static markups are serialized once instead of on every send: PTB calls
+    to_dict() on reply_markup for each request it builds."""
+
+    __slots__ = ()
+
+    def _cache_payload(self) -> None:
+        # underscored attributes may be set on frozen TelegramObjects
+        self._payload = super().to_dict()
+        self._json = json.dumps(self._payload)
+
+    def to_dict(self, recursive: bool = True) -> dict:
+        return dict(self._payload)
+
+    def to_json(self, *args, **kwargs) -> str:
+        return self._json
+
+
+class CachedReplyKeyboardMarkup(_CachedPayload, ReplyKeyboardMarkup):
+    __slots__ = ("_payload", "_json")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_payload()
+
+
+class CachedInlineKeyboardMarkup(_CachedPayload, InlineKeyboardMarkup):
+    __slots__ = ("_payload", "_json")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_payload()
+
+
+class CachedReplyKeyboardRemove(_CachedPayload, ReplyKeyboardRemove):
+    __slots__ = ("_payload", "_json")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_payload()
+
+
 class Replies(Enum):
     PROFILE = "Посмотреть мой профиль 🔍"
     EDIT = "Заполнить профиль заново ✍️"
+    QUICK = "Заполнить одним сообщением ⚡"
     VIEW = "Смотреть анкеты 🚀"
     INFO = "Как пользоваться?"
 
@@ -22,11 +105,14 @@ class Replies(Enum):
     LIKE = "❤️"
     DISLIKE = "👎"
 
+    DEMOS_DONE = "Готово ✅"
+
     START = "Привет, роцкер, заполни анкету, чтобы продолжить\nВведи свое имя:"
     FACULTY = "Введи факультет на котором учишься:"
     COURSE = "Введи курс на котором ты учишься:"
     EDUCATION = "Выбери уровень своего музыкального образования:"
-    LINK = "Пришли ссылку на яндекс диск с твоими  материалами (демки, записи игры на инструменте и т.д.)"
+    LINK = """Пришли ссылку на яндекс диск с твоими материалами (демки, записи игры на инструменте и т.д.)
+Или пришли их прямо сюда: голосовые, аудио или видео"""
     EX = "Опыт игры, сколько и на чём играешь?"
     MUSIC = "Музыка - это больше хобби или путь жизни?"
     FAVS = """Какую музыку слушаешь? 
@@ -81,6 +167,9 @@ class Replies(Enum):
 ├─ 👁‍🗨 <b>Просмотр профилей</b>
 │   └── Знакомься с опытом и стилем других
 │
+├─ 🎸 <b>/filter</b>
+│   └── Только те, кто играет на нужных инструментах
+│
 └─ 💭 <b>Чтение историй</b>
     └── Узнавай о музыкальных предпочтениях
 
@@ -126,27 +215,28 @@ class Replies(Enum):
 🎶 <i>Пусть каждый аккорд приведёт тебя к новым возможностям!</i>
 """
 
-    CONTINUE_MARKUP = ReplyKeyboardMarkup(
+    CONTINUE_MARKUP = CachedReplyKeyboardMarkup(
         [[CONTINUE]],
         resize_keyboard=True,
         one_time_keyboard=True,
     )
 
-    CONTINUE_WATCHING_MARKUP = ReplyKeyboardMarkup(
+    CONTINUE_WATCHING_MARKUP = CachedReplyKeyboardMarkup(
         [[CONTINUE_WATCHING]],
         resize_keyboard=True,
         one_time_keyboard=True,
     )
 
-    MAIN_MARKUP = ReplyKeyboardMarkup(
+    MAIN_MARKUP = CachedReplyKeyboardMarkup(
         [
             [PROFILE, EDIT],
+            [QUICK],
             [VIEW, INFO],
         ],
         resize_keyboard=True,
         one_time_keyboard=True,
     )
-    LIKE_MARKUP = ReplyKeyboardMarkup(
+    LIKE_MARKUP = CachedReplyKeyboardMarkup(
         [
             [LIKE, DISLIKE],
             [PROFILE],
@@ -154,3 +244,145 @@ class Replies(Enum):
         resize_keyboard=True,
         one_time_keyboard=True,
     )
+
+    DEMOS_MARKUP = CachedReplyKeyboardMarkup(
+        [[DEMOS_DONE]],
+        resize_keyboard=True,
+        one_time_keyboard=True,
+    )
+
+    EDUCATION_MARKUP = CachedInlineKeyboardMarkup(
+        [
+            [InlineKeyboardButton(member.value, callback_data=member.name)]
+            for member in MusicEducation.__members__.values()
+        ]
+    )
+    REMOVE_MARKUP = CachedReplyKeyboardRemove()
+    NOTIFICATIONS_MARKUP = CachedInlineKeyboardMarkup(
+        [
+            [InlineKeyboardButton(member.value, callback_data=f"notify:{member.name}")]
+            for member in NotificationMode.__members__.values()
+        ]
+    )
+
+
+@lru_cache(maxsize=None)
+def instruments_markup(
+    prefix: str, selected: frozenset[MusicInstrument]
+) -> CachedInlineKeyboardMarkup:
+    """Multi-select keyboard, selected instruments are ticked. There are only
+    2 ** len(MusicInstrument) selections, so each one is built once."""
+    buttons = [
+        InlineKeyboardButton(
+            f"✅ {member.title}" if member in selected else member.title,
+            callback_data=f"{prefix}:{member.name}",
+        )
+        for member in MusicInstrument
+    ]
+    return CachedInlineKeyboardMarkup(
+        [buttons[i : i + 2] for i in range(0, len(buttons), 2)]
+        + [[InlineKeyboardButton("Готово", callback_data=f"{prefix}:DONE")]]
+    )
+
+
+class Template:
+    """A ready-to-send reply: keyword arguments for reply_text/send_message
+    are built once, only `{fields}` in the text are filled in per message."""
+
+    __slots__ = ("text", "kwargs", "_static")
+
+    def __init__(
+        self,
+        text: str,
+        reply_markup: TelegramObject | None = None,
+        parse_mode: str | None = None,
+    ):
+        self.text = text
+        self.kwargs = {}
+        if reply_markup is not None:
+            self.kwargs["reply_markup"] = reply_markup
+        if parse_mode is not None:
+            self.kwargs["parse_mode"] = parse_mode
+        self._static = {"text": text, **self.kwargs}
+
+    def render(self, **fields) -> dict:
+        if not fields:
+            return self._static
+        return {"text": self.text.format(**fields), **self.kwargs}
+
+
+class Templates:
+    START = Template(Replies.START.value)
+    ENTER_NAME = Template("Введи имя:")
+    FACULTY = Template(Replies.FACULTY.value)
+    COURSE = Template(Replies.COURSE.value)
+    EDUCATION = Template(
+        Replies.EDUCATION.value, reply_markup=Replies.EDUCATION_MARKUP.value
+    )
+    INSTRUMENTS = Template(
+        "На чём играешь? Отметь всё подходящее и нажми «Готово»"
+    )
+    EXPERIENCE = Template("Сколько лет играешь: {instrument}? Введи число")
+    EX = Template(Replies.EX.value)
+    MUSIC = Template(Replies.MUSIC.value)
+    FAVS = Template(Replies.FAVS.value)
+    OPINION = Template(Replies.OPINION.value)
+    GROUP = Template(Replies.GROUP.value)
+    FIND = Template(Replies.FIND.value)
+    LINK = Template(Replies.LINK.value)
+    MANUAL = Template(Replies.MAN.value, parse_mode="HTML")
+    DEMO_ADDED = Template(
+        "Добавлено: {count}. Пришли ещё, ссылку или нажми «Готово»",
+        reply_markup=Replies.DEMOS_MARKUP.value,
+    )
+
+    CHOOSE_ACTION = Template(
+        "Выбери действие:", reply_markup=Replies.MAIN_MARKUP.value
+    )
+    PROFILE = Template("{profile}", reply_markup=Replies.MAIN_MARKUP.value)
+    PROFILE_SAVED = Template("Профиль сохранен")
+    NO_PROFILES = Template(
+        "Профилей пока нет", reply_markup=Replies.MAIN_MARKUP.value
+    )
+    CARD = Template("{profile}", reply_markup=Replies.LIKE_MARKUP.value)
+
+    LIKED_BY = Template(
+        "Твой профиль понравился\n{profile}",
+        reply_markup=Replies.CONTINUE_WATCHING_MARKUP.value,
+    )
+    MATCHED_BY = Template(
+        "Твой профиль понравился\n{profile}\nНачинай общаться 👉{username}",
+        reply_markup=Replies.CONTINUE_MARKUP.value,
+    )
+    MATCH = Template("Начинай общаться 👉{username}")
+    DIGEST = Template(
+        "Твой профиль понравился {period}: {count}\n{names}",
+        reply_markup=Replies.CONTINUE_WATCHING_MARKUP.value,
+    )
+    NOTIFICATIONS = Template(
+        "Как присылать уведомления о лайках?",
+        reply_markup=Replies.NOTIFICATIONS_MARKUP.value,
+    )
+    NOTIFICATIONS_SAVED = Template("Уведомления о лайках: {mode}")
+
+    STATS = Template(
+        "Анкет: {profiles}\n"
+        "Ставили лайки: {likers} ({like_rate})\n"
+        "Лайков: {likes}, взаимных пар: {matches} ({match_rate} лайков взаимны)\n\n"
+        "По факультетам:\n{faculties}\n\n"
+        "По образованию:\n{educations}\n\n"
+        "Обновлено {age} с назад"
+    )
+
+    FILTER = Template(
+        "Кого ищешь? Покажу анкеты только с отмеченными инструментами"
+    )
+    FILTER_SAVED = Template("Показываю анкеты: {instruments}")
+    FILTER_RESET = Template("Показываю все анкеты")
+
+    THROTTLED = Template("Слишком быстро 🙂 Подожди пару секунд и продолжай")
+
+    RESTART = Template(
+        "🔄 Сессия сброшена! Начинаем заново.\nОтправь /start чтобы начать сначала.",
+        reply_markup=Replies.REMOVE_MARKUP.value,
+    )